@@ -0,0 +1,121 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+Benchmark of :class:`score.uwsgi.iniparser.UwsgiIni` on an ini file with
+thousands of zergling sections, covering loading (with and without cache),
+serialization and key access::
+
+    python benchmarks/iniparser.py [SECTIONS]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+from score.uwsgi.iniparser import UwsgiIni
+
+KEYS = ('zerg', 'daemonize', 'pidfile', 'stats-server', 'master-fifo',
+        'master-fifo', 'plugin', 'plugin', 'ini-paste', 'hook-asap',
+        'hook-accepting1-once', 'hook-as-user-atexit', 'hook-as-user-atexit')
+
+
+def generate(sections):
+    """
+    Returns the contents of an ini file with given number of *sections*,
+    which look like the ones written by :meth:`.Zergling.regenini`.
+    """
+    parts = []
+    for i in range(sections):
+        parts.append('[zergling-%d]\n' % i)
+        for key in KEYS:
+            parts.append('%s = /srv/app/zergling-%d/%s\n' % (key, i, key))
+        parts.append('logdate = true\n\n')
+    return ''.join(parts)
+
+
+def best(func, number=1, repeat=5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def report(name, seconds):
+    print('%-24s %10.3fms' % (name, seconds * 1000))
+
+
+def main(sections=5000):
+    text = generate(sections)
+    print('%d sections, %d bytes' % (sections, len(text)))
+    folder = tempfile.mkdtemp()
+    try:
+        path = os.path.join(folder, 'uwsgi.ini')
+        with open(path, 'w') as fp:
+            fp.write(text)
+        cachefile = os.path.join(folder, '.uwsgi.ini.cache')
+
+        def cold():
+            try:
+                os.remove(cachefile)
+            except FileNotFoundError:
+                pass
+            UwsgiIni.load_path(path)
+
+        def touched():
+            os.utime(path)
+            UwsgiIni.load_path(path)
+
+        report('load without cache',
+               best(lambda: UwsgiIni.load_path(path, cache=False)))
+        report('load, cold cache', best(cold))
+        report('load, warm cache', best(lambda: UwsgiIni.load_path(path)))
+        report('load, touched file', best(touched))
+
+        ini = UwsgiIni()
+        ini.loads(text)
+        sections = list(ini.sections.values())
+
+        def getitem():
+            for section in sections:
+                section['stats-server']
+                section['logdate']
+
+        def get_all():
+            for section in sections:
+                section.get_all('plugin')
+                section.get_all('hook-as-user-atexit')
+
+        report('loads', best(lambda: UwsgiIni().loads(text)))
+        report('dumps', best(ini.dumps))
+        report('getitem, all sections', best(getitem))
+        report('get_all, all sections', best(get_all))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -25,15 +25,19 @@
 # Licensee has his registered seat, an establishment or assets.
 
 
+import importlib
 import os
-from score.init import ConfiguredModule, ConfigurationError
-from .process import (
-    Overlord, Zergling, NoSuchZergling, AlreadyPaused,
-    AlreadyRunning, AlreadyReloading, NotRunning)
 
 
 defaults = {
     'rootdir': None,
+    'stats_ttl': '1s',
+    'stats_connect_timeout': '1s',
+    'stats_read_timeout': '5s',
+    'stats_max_size': str(16 * 1024 * 1024),
+    'command_timeout': '10s',
+    'drain_timeout': '60s',
+    'cpu_affinity': 'false',
 }
 
 
@@ -45,51 +49,96 @@ def init(confdict):
     :confkey:`rootdir` :faint:`[default=None]`
         The folder containing all uwsgi instances' files.
 
+    :confkey:`stats_ttl` :faint:`[default=1s]`
+        The time interval for which a process' statistics snapshot is re-used
+        when answering questions like "is this zergling paused?". Set this to
+        `0` to query the statistics socket every time.
+
+    :confkey:`stats_connect_timeout` :faint:`[default=1s]`
+        Maximum time to wait for a statistics socket to accept a connection.
+
+    :confkey:`stats_read_timeout` :faint:`[default=5s]`
+        Maximum time to wait for the complete statistics of a process.
+        Processes exceeding either timeout are reported as unresponsive (see
+        :class:`.StatsTimeout`).
+
+    :confkey:`stats_max_size` :faint:`[default=16777216]`
+        Maximum size of a statistics payload in bytes.
+
+    :confkey:`command_timeout` :faint:`[default=10s]`
+        Maximum time to wait for a process to confirm a command, like
+        :meth:`pausing <.Zergling.pause>` with *wait*.
+
+    :confkey:`drain_timeout` :faint:`[default=60s]`
+        Maximum time to wait for the in-flight requests of a zergling to
+        finish, when it is :meth:`drained <.Zergling.drain>`.
+
+    :confkey:`cpu_affinity` :faint:`[default=false]`
+        Whether each zergling should be bound to its own set of CPUs. The CPUs
+        available to the process are partitioned among the zerglings of an
+        overlord along the NUMA nodes of the host, and re-partitioned whenever
+        zerglings are added or removed (see :meth:`.Overlord.rebalance`).
+
     """
+    from score.init import (
+        ConfigurationError, parse_bool, parse_time_interval)
+    from .configured import ConfiguredUwsgiModule
     conf = defaults.copy()
     conf.update(confdict)
     if not conf['rootdir']:
         raise ConfigurationError(__package__,
                                  'No root folder provided')
     os.makedirs(conf['rootdir'], exist_ok=True)
-    return ConfiguredUwsgiModule(conf['rootdir'])
-
-
-class ConfiguredUwsgiModule(ConfiguredModule):
-    """
-    This module's :class:`configuration object
-    <score.init.ConfiguredModule>`.
-    """
-
-    def __init__(self, rootdir):
-        super().__init__(__package__)
-        self.rootdir = rootdir
-        conf = self
-
-        class ConfiguredOverlord(Overlord):
-
-            @classmethod
-            def instances(cls):
-                for folder in os.listdir(conf.rootdir):
-                    if os.path.isdir(os.path.join(conf.rootdir, folder)):
-                        overlord = cls(folder)
-                        if overlord.is_running():
-                            yield overlord
+    return ConfiguredUwsgiModule(
+        conf['rootdir'],
+        stats_ttl=parse_time_interval(conf['stats_ttl']),
+        stats_connect_timeout=parse_time_interval(
+            conf['stats_connect_timeout']),
+        stats_read_timeout=parse_time_interval(conf['stats_read_timeout']),
+        stats_max_size=int(conf['stats_max_size']),
+        command_timeout=parse_time_interval(conf['command_timeout']),
+        drain_timeout=parse_time_interval(conf['drain_timeout']),
+        cpu_affinity=parse_bool(conf['cpu_affinity']))
+
+
+#: Names exported by this package and the submodule defining each of them.
+#: They are imported on first access, keeping the import of this package
+#: (and thus the startup of the command line interface) cheap.
+_lazy = {
+    'ConfiguredUwsgiModule': 'configured',
+    'UwsgiProcess': 'process',
+    'Overlord': 'process',
+    'Zergling': 'process',
+    'NoSuchZergling': 'process',
+    'AlreadyPaused': 'process',
+    'AlreadyRunning': 'process',
+    'AlreadyReloading': 'process',
+    'NotRunning': 'process',
+    'Timeout': 'process',
+    'StatsTimeout': 'process',
+    'StatsTooLarge': 'process',
+    'InsufficientCapacity': 'process',
+    'StatsReader': 'shm',
+}
 
-            def __init__(self, *args, **kwargs):
-                self.conf = conf
-                super().__init__(*args, **kwargs)
 
-        class ConfiguredZergling(Zergling):
+def __getattr__(name):
+    try:
+        module = _lazy[name]
+    except KeyError:
+        raise AttributeError(
+            'module %r has no attribute %r' % (__name__, name)) from None
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
 
-            def __init__(self, *args, **kwargs):
-                self.conf = conf
-                super().__init__(*args, **kwargs)
 
-        self.Overlord = ConfiguredOverlord
-        self.Zergling = ConfiguredZergling
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
 
 
 __all__ = [
     'init', 'ConfiguredUwsgiModule', 'Overlord', 'Zergling', 'NoSuchZergling',
-    'AlreadyPaused', 'AlreadyRunning', 'AlreadyReloading', 'NotRunning']
+    'AlreadyPaused', 'AlreadyRunning', 'AlreadyReloading', 'NotRunning',
+    'Timeout', 'StatsTimeout', 'StatsTooLarge', 'InsufficientCapacity',
+    'StatsReader']
@@ -0,0 +1,285 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+A controller that adjusts the number of serving zerglings of an overlord to
+the current load, as reported by the statistics sockets.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from .collector import collect_stats
+from .process import NotRunning, StatsTimeout
+
+log = logging.getLogger(__name__)
+
+#: The statistics fields needed for measuring the load.
+FIELDS = ('listen_queue', 'workers[*].status')
+
+
+class Load:
+    """
+    A measurement taken by :meth:`.Autoscaler.measure`.
+
+    :attr:`queue`
+        The largest listen queue of the overlord and the zerglings.
+
+    :attr:`busy`
+        The number of busy workers in :attr:`active` zerglings.
+
+    :attr:`workers`
+        The number of workers in :attr:`active` zerglings.
+
+    :attr:`active`
+        The running zerglings that are not paused.
+
+    :attr:`paused`
+        The running zerglings that are paused, excluding standby zerglings.
+
+    :attr:`pending`
+        The zerglings that are still starting up or not responding in time.
+        They will provide capacity soon and count towards the limits of the
+        :class:`.Autoscaler`.
+    """
+
+    def __init__(self, queue, busy, workers, active, paused, pending=()):
+        self.queue = queue
+        self.busy = busy
+        self.workers = workers
+        self.active = active
+        self.paused = paused
+        self.pending = list(pending)
+
+    @property
+    def serving(self):
+        """
+        The number of :attr:`active` and :attr:`pending` zerglings.
+        """
+        return len(self.active) + len(self.pending)
+
+    @property
+    def utilization(self):
+        """
+        The ratio of busy workers, between 0 and 1. Without any workers,
+        nothing is busy and the utilization is 0, the :attr:`queue` and the
+        minimum number of zerglings decide whether capacity is added.
+        """
+        if not self.workers:
+            return 0.0
+        return self.busy / self.workers
+
+
+class Autoscaler:
+    """
+    Scales the zerglings of an *overlord* serving given *appini*.
+
+    Capacity is added, when the listen queue reaches *up_queue* or the ratio
+    of busy workers reaches *up_busy* in *up_cycles* consecutive
+    measurements. It is removed when there is no queue and the ratio of busy
+    workers stays at or below *down_busy* for *down_cycles* measurements. The
+    gap between the two thresholds and the number of cycles provide the
+    hysteresis that prevents flapping, while no action is taken for
+    *cooldown* seconds after a change.
+
+    Scaling up first resumes a paused zergling, then a standby zergling (see
+    :meth:`.Overlord.scale_up`, which will keep *pool_size* standby zerglings
+    around) and spawns a new zergling as last resort. Scaling down pauses an
+    idle zergling. The number of active zerglings, including those that are
+    still starting up, is kept between *min_zerglings* and *max_zerglings*.
+    Falling below *min_zerglings* triggers a scale-up without waiting for
+    *up_cycles* measurements, but still respects the *cooldown*.
+    """
+
+    def __init__(self, overlord, appini, *, min_zerglings=1,
+                 max_zerglings=None, up_queue=1, up_busy=0.8,
+                 down_busy=0.3, up_cycles=2, down_cycles=6, cooldown=30.0,
+                 pool_size=0, virtualenv=None):
+        if down_busy >= up_busy:
+            raise ValueError('down_busy must be lower than up_busy')
+        self.overlord = overlord
+        self.appini = os.path.abspath(appini)
+        self.min_zerglings = min_zerglings
+        self.max_zerglings = max_zerglings
+        self.up_queue = up_queue
+        self.up_busy = up_busy
+        self.down_busy = down_busy
+        self.up_cycles = up_cycles
+        self.down_cycles = down_cycles
+        self.cooldown = cooldown
+        self.pool_size = pool_size
+        self.virtualenv = virtualenv
+        self._up = 0
+        self._down = 0
+        self._last_action = None
+        self._stop = threading.Event()
+
+    def zerglings(self):
+        """
+        All zerglings of the overlord serving the configured app ini, that are
+        not in the standby pool.
+        """
+        return [z for z in self.overlord.zerglings()
+                if not z.standby and os.path.abspath(z.appini) == self.appini]
+
+    def measure(self):
+        """
+        Reads the statistics of the overlord and the zerglings and returns a
+        :class:`.Load` object.
+        """
+        zerglings = self.zerglings()
+        results = collect_stats([self.overlord] + zerglings, fields=FIELDS)
+        queue = busy = workers = 0
+        active = []
+        paused = []
+        pending = []
+        for process, result in results.items():
+            if not result.ok:
+                if process is not self.overlord and (
+                        isinstance(result.error, StatsTimeout) or
+                        process.is_starting()):
+                    pending.append(process)
+                continue
+            queue = max(queue, result.value.get('listen_queue', 0))
+            if process is self.overlord:
+                continue
+            statuses = [w['status'] for w in result.value.get('workers', [])]
+            if statuses and all(s == 'pause' for s in statuses):
+                paused.append(process)
+                continue
+            active.append(process)
+            busy += statuses.count('busy')
+            workers += sum(1 for s in statuses if s not in ('pause', 'cheap'))
+        return Load(queue, busy, workers, active, paused, pending)
+
+    def decide(self, load):
+        """
+        Updates the hysteresis counters with given *load* and returns the
+        action to take: ``'up'``, ``'down'`` or `None`.
+        """
+        if load.queue >= self.up_queue or load.utilization >= self.up_busy:
+            self._up += 1
+            self._down = 0
+        elif load.queue == 0 and load.utilization <= self.down_busy:
+            self._down += 1
+            self._up = 0
+        else:
+            self._up = self._down = 0
+        if self._cooling_down():
+            return None
+        if load.serving < self.min_zerglings:
+            return 'up' if self._below_max(load) else None
+        if self._up >= self.up_cycles:
+            if self._below_max(load):
+                return 'up'
+        elif self._down >= self.down_cycles:
+            if load.serving > self.min_zerglings:
+                return 'down'
+        return None
+
+    def _cooling_down(self):
+        return self._last_action is not None and \
+            time.monotonic() - self._last_action < self.cooldown
+
+    def _below_max(self, load):
+        return self.max_zerglings is None or \
+            load.serving < self.max_zerglings
+
+    def step(self):
+        """
+        Performs a single measurement and acts upon it. Returns the zergling
+        that was resumed, spawned or paused, or `None` if nothing was done.
+        """
+        load = self.measure()
+        action = self.decide(load)
+        if action == 'up':
+            zergling = self.scale_up(load)
+        elif action == 'down':
+            zergling = self.scale_down(load)
+        else:
+            return None
+        if zergling is not None:
+            self._up = self._down = 0
+            self._last_action = time.monotonic()
+        return zergling
+
+    def scale_up(self, load):
+        """
+        Adds a zergling to the active ones of given *load*.
+        """
+        for zergling in load.paused:
+            try:
+                zergling.resume()
+            except (NotRunning, StatsTimeout):
+                continue
+            log.info('Resumed %s (queue=%d, utilization=%.2f)' % (
+                zergling, load.queue, load.utilization))
+            return zergling
+        zergling = self.overlord.scale_up(
+            self.appini, pool_size=self.pool_size,
+            virtualenv=self.virtualenv, refill=self.pool_size > 0)
+        log.info('Added %s (queue=%d, utilization=%.2f)' % (
+            zergling, load.queue, load.utilization))
+        return zergling
+
+    def scale_down(self, load):
+        """
+        Pauses one of the idle zerglings of given *load*.
+        """
+        for zergling in reversed(load.active):
+            try:
+                stats = zergling.read_stats(fields=['workers[*].status'])
+            except (NotRunning, StatsTimeout):
+                continue
+            if any(w['status'] == 'busy' for w in stats['workers']):
+                continue
+            zergling.pause()
+            log.info('Paused %s (utilization=%.2f)' % (
+                zergling, load.utilization))
+            return zergling
+        return None
+
+    def run(self, interval=5.0):
+        """
+        Calls :meth:`.step` every *interval* seconds until :meth:`.stop` is
+        called.
+        """
+        while not self._stop.is_set():
+            start = time.monotonic()
+            try:
+                self.step()
+            except Exception:
+                log.exception('Error scaling %s' % self.overlord)
+            self._stop.wait(max(0, interval - (time.monotonic() - start)))
+
+    def stop(self):
+        """
+        Makes :meth:`.run` return after the current step.
+        """
+        self._stop.set()
@@ -26,8 +26,13 @@
 
 
 import click
+from collections import OrderedDict
+import fnmatch
 import json
 import score.uwsgi
+import signal
+import sys
+from score.uwsgi.control import forward, runs_locally
 
 
 def parse_alias(alias):
@@ -39,6 +44,8 @@ def parse_alias(alias):
 
 def zergling_status(zergling):
     status = []
+    if zergling.standby:
+        status.append('standby')
     try:
         if zergling.is_reloading():
             status.append('reloading')
@@ -49,28 +56,176 @@ def zergling_status(zergling):
             status.append('starting')
         else:
             status.append('stopped')
+    except score.uwsgi.StatsTimeout:
+        status.append('unresponsive')
+    if zergling.cpu_affinity and zergling.cpus:
+        from score.uwsgi.placement import format_cpulist
+        status.append('cpus %s' % format_cpulist(zergling.cpus))
     return status
 
 
-@click.group()
+def select_zerglings(ctx, aliases, all_=False):
+    """
+    Resolves zergling *aliases* to an :class:`collections.OrderedDict`
+    mapping overlords to lists of zerglings. Both parts of an alias may
+    contain shell-style wildcards, like ``myapp/*``. If *all_* is truthy, all
+    zerglings of all overlords are selected.
+    """
+    if not aliases and not all_:
+        raise click.UsageError('No zerglings given, use --all to select all.')
+    if all_:
+        aliases = ('*/*',)
+    selection = OrderedDict()
+    overlords = None
+    for alias in aliases:
+        overlord, name = parse_alias(alias)
+        if not name:
+            raise click.ClickException('No zergling with that name.')
+        if not _is_pattern(overlord):
+            matches = [ctx.obj.uwsgi.Overlord(overlord)]
+        else:
+            if overlords is None:
+                overlords = ctx.obj.uwsgi.Overlord.discover()
+            matches = [o for o in overlords
+                       if fnmatch.fnmatchcase(o.name, overlord)]
+        for overlord in matches:
+            if _is_pattern(name):
+                zerglings = [z for z in overlord.zerglings()
+                             if fnmatch.fnmatchcase(z.name, name)]
+            else:
+                try:
+                    zerglings = [overlord.zergling(name)]
+                except score.uwsgi.NoSuchZergling:
+                    raise click.ClickException('No zergling with that name.')
+            selected = selection.setdefault(overlord.name, (overlord, []))[1]
+            selected.extend(z for z in zerglings if z not in selected)
+    return OrderedDict(selection.values())
+
+
+def _is_pattern(string):
+    return any(char in string for char in '*?[')
+
+
+def command_all(selection, method, *, ignore=(), **kwargs):
+    """
+    Invokes the bulk operation *method* (like :meth:`.Overlord.pause_all`)
+    of all overlords in given *selection* concurrently and reports failures
+    on stderr. Errors of the classes in *ignore* do not count as failures.
+
+    Returns a mapping of overlords to their zerglings, for which the
+    operation succeeded, and the number of failures.
+    """
+    from score.uwsgi.collector import gather
+    results = gather(
+        lambda overlord: getattr(overlord, method)(
+            selection[overlord], **kwargs),
+        selection)
+    succeeded = OrderedDict()
+    failures = 0
+    for overlord, result in results.items():
+        if not result.ok:
+            raise result.error
+        succeeded[overlord] = []
+        for zergling, outcome in result.value.items():
+            if outcome.ok or isinstance(outcome.error, ignore):
+                succeeded[overlord].append(zergling)
+                continue
+            failures += 1
+            click.echo('%s/%s: %s' % (
+                overlord.name, zergling.name, _describe(outcome.error)),
+                err=True)
+    return succeeded, failures
+
+
+def _describe(error):
+    messages = (
+        (score.uwsgi.AlreadyPaused, 'already paused'),
+        (score.uwsgi.AlreadyRunning, 'already running'),
+        (score.uwsgi.NotRunning, 'not running'),
+        (score.uwsgi.Timeout, 'timeout'),
+    )
+    for cls, message in messages:
+        if isinstance(error, cls):
+            return message
+    return str(error) or type(error).__name__
+
+
+class ForwardingGroup(click.Group):
+    """
+    A click group remembering the command line of the invoked sub-command,
+    so it can be forwarded to a :class:`~score.uwsgi.daemon.ControlDaemon`.
+    """
+
+    def resolve_command(self, ctx, args):
+        ctx.meta['score.uwsgi.argv'] = list(args)
+        return super().resolve_command(ctx, args)
+
+
+@click.group(cls=ForwardingGroup)
 @click.argument('conf', type=click.Path(file_okay=True, dir_okay=False))
 @click.pass_context
 def main(ctx, conf):
     """
     Manages uwsgi processes.
+
+    Commands are executed by the control daemon of the configuration file, if
+    one is running (see the "daemon" command).
     """
-    ctx.obj = score.init.init_from_file(conf)
+    if _is_configured(ctx.obj):
+        # executed by the control daemon
+        return
+    argv = ctx.meta.get('score.uwsgi.argv', [])
+    if argv and not runs_locally(argv):
+        try:
+            response = forward(conf, argv)
+        except ConnectionError as e:
+            raise click.ClickException(str(e))
+        if response is not None:
+            click.echo(response['stdout'], nl=False)
+            click.echo(response['stderr'], nl=False, err=True)
+            ctx.exit(response['status'])
+    from score.init import init_from_file
+    ctx.obj = init_from_file(conf)
+
+
+def _is_configured(obj):
+    # score.init is expensive to import and the object cannot be a
+    # ConfiguredScore unless it was already imported by someone else
+    init = sys.modules.get('score.init')
+    return init is not None and isinstance(obj, init.ConfiguredScore)
 
 
 @main.command('status')
 @click.pass_context
 def status(ctx):
-    for overlord in ctx.obj.uwsgi.Overlord.instances():
-        print(overlord.name)
-        for zergling in overlord.zerglings():
-            status = zergling_status(zergling)
-            status = ' (%s)' % ', '.join(status) if status else ''
-            print("    %s%s" % (zergling.name, status))
+    running = set()
+    for process, result in ctx.obj.uwsgi.collect_stats(snapshot=True).items():
+        if not isinstance(process, score.uwsgi.Zergling):
+            if result.ok:
+                running.add(process)
+                print(process.name)
+            elif isinstance(result.error, score.uwsgi.StatsTimeout):
+                running.add(process)
+                print('%s (unresponsive)' % process.name)
+            continue
+        if process.overlord not in running:
+            continue
+        status = zergling_status(process)
+        status = ' (%s)' % ', '.join(status) if status else ''
+        print("    %s%s" % (process.name, status))
+
+
+@main.command('rebalance')
+@click.argument('overlord')
+@click.pass_context
+def rebalance(ctx, overlord):
+    """
+    Places the zerglings of an overlord on the CPUs of the host anew.
+    """
+    from score.uwsgi.placement import format_cpulist
+    overlord = ctx.obj.uwsgi.Overlord(overlord)
+    for zergling in overlord.rebalance():
+        print('%s: cpus %s' % (zergling, format_cpulist(zergling.cpus)))
 
 
 @main.command('spawn-overlord')
@@ -95,6 +250,62 @@ def slay_overlord(ctx, name):
     ctx.obj.uwsgi.Overlord(name).stop()
 
 
+def tuning_options(func):
+    """
+    Adds options for the settings of a :class:`score.uwsgi.tuning.Tuning`
+    profile to a command. The command receives them as keyword arguments,
+    which can be passed to :func:`make_tuning`.
+    """
+    options = (
+        click.option('--processes', type=int,
+                     help="Number of worker processes"),
+        click.option('--threads', type=int,
+                     help="Number of threads per worker"),
+        click.option('--loop', type=click.Choice(['gevent', 'asyncio']),
+                     help="Asynchronous loop engine"),
+        click.option('--async-cores', type=int,
+                     help="Concurrent requests per worker of the loop"),
+        click.option('--buffer-size', type=int,
+                     help="Size of the request header buffer in bytes"),
+        click.option('--listen', type=int,
+                     help="Size of the listen queue"),
+        click.option('--harakiri', type=int,
+                     help="Seconds after which a request is aborted"),
+        click.option('--max-requests', type=int,
+                     help="Requests after which a worker is recycled"),
+        click.option('--cheaper', type=int,
+                     help="Minimum number of workers"),
+        click.option('--cheaper-algo',
+                     help="Algorithm for spawning workers on demand"),
+        click.option('--cheaper-initial', type=int,
+                     help="Number of workers at startup"),
+        click.option('--cheaper-step', type=int,
+                     help="Number of workers to spawn at once"),
+        click.option('--thunder-lock/--no-thunder-lock', default=None,
+                     help="Serialize accept() calls"),
+    )
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+def make_tuning(settings, base=None):
+    """
+    Creates a :class:`score.uwsgi.tuning.Tuning` profile from the keyword
+    arguments of the :func:`tuning_options`. Given settings replace those of
+    the *base* profile, if there is one.
+    """
+    from score.uwsgi.tuning import Tuning
+    settings = dict((name, value) for name, value in settings.items()
+                    if value is not None)
+    try:
+        if base is not None:
+            return base.replace(**settings)
+        return Tuning(**settings)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+
 @main.command('spawn-zergling')
 @click.argument('overlord')
 @click.argument('file',
@@ -103,96 +314,409 @@ def slay_overlord(ctx, name):
               type=click.Path(file_okay=False, dir_okay=True, writable=False),
               help="Path to the virtualenv")
 @click.option('-p', '--paused', is_flag=True, default=False)
+@tuning_options
 @click.pass_context
-def spawn_zergling(ctx, overlord, file, paused, virtualenv=None):
+def spawn_zergling(ctx, overlord, file, paused, virtualenv=None, **tuning):
     overlord, name = parse_alias(overlord)
     overlord = ctx.obj.uwsgi.Overlord(overlord)
-    zerglings = overlord.zerglings()
-    if not name:
-        maxname = len(zerglings)
-        for zergling in zerglings:
-            try:
-                maxname = max(maxname, int(zergling.name))
-            except ValueError:
-                pass
-        name = str(maxname + 1)
-    try:
-        zergling = next(z for z in zerglings if z.name == name)
-    except StopIteration:
-        zergling = ctx.obj.uwsgi.Zergling(overlord, name, file)
-    zergling.regenini(startpaused=paused, virtualenv=virtualenv)
+    # allocate the name in the same transaction that writes the section
+    with overlord.edit_ini():
+        if not name:
+            name = overlord.new_zergling_name()
+        try:
+            zergling = overlord.zergling(name)
+        except score.uwsgi.NoSuchZergling:
+            zergling = ctx.obj.uwsgi.Zergling(overlord, name, file)
+        tuning = make_tuning(tuning, zergling.tuning)
+        zergling.regenini(startpaused=paused, virtualenv=virtualenv,
+                          tuning=tuning)
     zergling.start()
 
 
-@main.command('pause-zergling')
-@click.argument('zergling')
+@main.command('warm-pool')
+@click.argument('overlord')
+@click.argument('file',
+                type=click.Path(file_okay=True, dir_okay=False))
+@click.option('-s', '--size', type=int, default=1,
+              help="Number of standby zerglings to keep")
+@click.option('-e', '--virtualenv',
+              type=click.Path(file_okay=False, dir_okay=True, writable=False),
+              help="Path to the virtualenv")
+@tuning_options
 @click.pass_context
-def pause_zergling(ctx, zergling):
-    overlord, zergling = parse_alias(zergling)
+def warm_pool(ctx, overlord, file, size, virtualenv=None, **tuning):
+    """
+    Spawns paused standby zerglings for later scale-ups.
+    """
+    overlord = ctx.obj.uwsgi.Overlord(overlord)
+    tuning = make_tuning(tuning)
+    for zergling in overlord.fill_pool(file, size, virtualenv=virtualenv,
+                                       tuning=tuning):
+        print('Spawned standby %s' % zergling)
+
+
+@main.command('scale-up')
+@click.argument('overlord')
+@click.argument('file',
+                type=click.Path(file_okay=True, dir_okay=False))
+@click.option('-s', '--pool-size', type=int, default=1,
+              help="Number of standby zerglings to re-fill the pool to")
+@click.option('-e', '--virtualenv',
+              type=click.Path(file_okay=False, dir_okay=True, writable=False),
+              help="Path to the virtualenv")
+@tuning_options
+@click.pass_context
+def scale_up(ctx, overlord, file, pool_size, virtualenv=None, **tuning):
+    """
+    Resumes a standby zergling and re-fills the pool.
+    """
+    overlord = ctx.obj.uwsgi.Overlord(overlord)
+    zergling = overlord.scale_up(file, pool_size=pool_size,
+                                 virtualenv=virtualenv,
+                                 tuning=make_tuning(tuning))
+    print('Serving with %s' % zergling)
+
+
+@main.command('autoscale')
+@click.argument('overlord')
+@click.argument('file',
+                type=click.Path(file_okay=True, dir_okay=False))
+@click.option('--min', 'min_zerglings', type=int, default=1,
+              help="Minimum number of active zerglings")
+@click.option('--max', 'max_zerglings', type=int, default=None,
+              help="Maximum number of active zerglings")
+@click.option('--up-queue', type=int, default=1,
+              help="Listen queue length triggering a scale-up")
+@click.option('--up-busy', type=float, default=0.8,
+              help="Ratio of busy workers triggering a scale-up")
+@click.option('--down-busy', type=float, default=0.3,
+              help="Ratio of busy workers allowing a scale-down")
+@click.option('--cooldown', type=float, default=30.0,
+              help="Seconds to wait after each change")
+@click.option('-s', '--pool-size', type=int, default=0,
+              help="Number of standby zerglings to keep")
+@click.option('-i', '--interval', type=float, default=5.0,
+              help="Seconds between two measurements")
+@click.option('-e', '--virtualenv',
+              type=click.Path(file_okay=False, dir_okay=True, writable=False),
+              help="Path to the virtualenv")
+@click.pass_context
+def autoscale(ctx, overlord, file, interval, **kwargs):
+    """
+    Resumes, spawns and pauses zerglings according to the load.
+    """
+    from score.uwsgi.autoscale import Autoscaler
+    overlord = ctx.obj.uwsgi.Overlord(overlord)
     try:
-        ctx.obj.uwsgi.Overlord(overlord).zergling(zergling).pause()
-    except score.uwsgi.NoSuchZergling:
-        raise click.ClickException('No zergling with that name.')
-    except score.uwsgi.AlreadyRunning:
-        raise click.ClickException('That zergling is already paused')
+        autoscaler = Autoscaler(overlord, file, **kwargs)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    try:
+        autoscaler.run(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+@main.command('pause-zergling')
+@click.argument('zerglings', nargs=-1)
+@click.option('-a', '--all', 'all_', is_flag=True, default=False,
+              help="Pause all zerglings of all overlords")
+@click.option('-w', '--wait', is_flag=True, default=False,
+              help="Wait until the workers report being paused")
+@click.option('-t', '--timeout', type=float, default=None,
+              help="Maximum number of seconds to wait")
+@click.pass_context
+def pause_zergling(ctx, zerglings, all_, wait, timeout):
+    """
+    Pauses zerglings, which may be given as patterns like "myapp/*".
+    """
+    selection = select_zerglings(ctx, zerglings, all_)
+    _, failures = command_all(selection, 'pause_all',
+                              wait=wait, timeout=timeout)
+    if failures:
+        ctx.exit(1)
 
 
 @main.command('stats')
 @click.argument('zergling')
+@click.option('-w', '--watch', is_flag=True, default=False,
+              help="Print a line with the current values periodically")
+@click.option('-r', '--rate', is_flag=True, default=False,
+              help="Print per-second deltas periodically (implies --watch)")
+@click.option('-i', '--interval', type=float, default=1.0,
+              help="Seconds between two lines when watching")
 @click.pass_context
-def stats_zergling(ctx, zergling):
+def stats_zergling(ctx, zergling, watch, rate, interval):
+    """
+    Prints the statistics of an overlord or a zergling.
+    """
     overlord, zergling = parse_alias(zergling)
     try:
         process = ctx.obj.uwsgi.Overlord(overlord)
         if zergling:
-            process = overlord.zergling(zergling)
-        stats = process.read_stats()
-        print(json.dumps(stats, sort_keys=True, indent=4))
+            process = process.zergling(zergling)
+        if watch or rate:
+            watch_stats(process, interval, rate)
+        else:
+            stats = process.read_stats()
+            print(json.dumps(stats, sort_keys=True, indent=4))
     except score.uwsgi.NoSuchZergling:
         raise click.ClickException('No zergling with that name.')
     except score.uwsgi.NotRunning:
         raise click.ClickException('Zergling not running.')
+    except score.uwsgi.StatsTimeout:
+        raise click.ClickException('Zergling not responding.')
+    except KeyboardInterrupt:
+        pass
+
+
+def watch_stats(process, interval, rate):
+    """
+    Reads the statistics of *process* every *interval* seconds and prints
+    either the current values or, if *rate* is truthy, the per-second
+    deltas of the counters. Memory consumption is bounded by the size of the
+    process' :class:`~score.uwsgi.history.History`.
+    """
+    import time
+    from score.uwsgi.history import History
+    process.history = History(size=2)
+    if rate:
+        print('%-8s %10s %10s %10s %10s %6s' % (
+            'time', 'req/s', 'exc/s', 'avg_rt/ms', 'rss/MiB', 'queue'))
+    else:
+        print('%-8s %10s %10s %10s %10s %6s' % (
+            'time', 'requests', 'exceptions', 'avg_rt/ms', 'rss/MiB',
+            'queue'))
+    while True:
+        started = time.monotonic()
+        process.read_stats()
+        sample = process.history[-1]
+        if rate:
+            requests, exceptions = (
+                '-' if value is None else '%.1f' % value
+                for value in (process.history.rate('requests'),
+                              process.history.rate('exceptions')))
+        else:
+            requests = '%d' % sample.requests
+            exceptions = '%d' % sample.exceptions
+        print('%-8s %10s %10s %10.1f %10.1f %6d' % (
+            time.strftime('%H:%M:%S', time.localtime(sample.time)),
+            requests, exceptions, sample.avg_rt / 1000,
+            sample.rss / 1024 / 1024, sample.listen_queue), flush=True)
+        time.sleep(max(0, interval - (time.monotonic() - started)))
 
 
 @main.command('resume-zergling')
-@click.argument('zergling')
+@click.argument('zerglings', nargs=-1)
+@click.option('-a', '--all', 'all_', is_flag=True, default=False,
+              help="Resume all zerglings of all overlords")
+@click.option('-w', '--wait', is_flag=True, default=False,
+              help="Wait until the workers no longer report being paused")
+@click.option('-t', '--timeout', type=float, default=None,
+              help="Maximum number of seconds to wait")
 @click.pass_context
-def resume_zergling(ctx, zergling):
-    overlord, zergling = parse_alias(zergling)
-    try:
-        ctx.obj.uwsgi.Overlord(overlord).zergling(zergling).resume()
-    except score.uwsgi.NoSuchZergling:
-        raise click.ClickException('No zergling with that name.')
-    except score.uwsgi.AlreadyRunning:
-        raise click.ClickException('That zergling is already running')
+def resume_zergling(ctx, zerglings, all_, wait, timeout):
+    """
+    Resumes zerglings, which may be given as patterns like "myapp/*".
+    """
+    selection = select_zerglings(ctx, zerglings, all_)
+    _, failures = command_all(selection, 'resume_all',
+                              wait=wait, timeout=timeout)
+    if failures:
+        ctx.exit(1)
 
 
 @main.command('kill-zergling')
-@click.argument('zergling')
+@click.argument('zerglings', nargs=-1)
+@click.option('-a', '--all', 'all_', is_flag=True, default=False,
+              help="Kill all zerglings of all overlords")
+@click.option('-d', '--drain', is_flag=True, default=False,
+              help="Pause first and wait for in-flight requests to finish")
+@click.option('-t', '--timeout', type=float, default=None,
+              help="Maximum number of seconds to wait when draining")
+@click.option('-f', '--force', is_flag=True, default=False,
+              help="Stop drained zerglings even if they are still busy")
 @click.pass_context
-def kill_zergling(ctx, zergling):
-    overlord, zergling = parse_alias(zergling)
-    try:
-        zergling = ctx.obj.uwsgi.Overlord(overlord).zergling(zergling)
-        zergling.stop()
-    except score.uwsgi.NoSuchZergling:
-        raise click.ClickException('No zergling with that name.')
-    except score.uwsgi.NotRunning:
-        pass
-    zergling.delete()
+def kill_zergling(ctx, zerglings, all_, drain, timeout, force):
+    """
+    Stops and removes zerglings, which may be given as patterns like
+    "myapp/*".
+    """
+    selection = select_zerglings(ctx, zerglings, all_)
+    if drain:
+        stopped, failures = command_all(selection, 'drain_all',
+                                        ignore=score.uwsgi.NotRunning,
+                                        timeout=timeout, force=force)
+    else:
+        stopped, failures = command_all(selection, 'stop_all',
+                                        ignore=score.uwsgi.NotRunning)
+    for overlord, zerglings in stopped.items():
+        with overlord.edit_ini():
+            for zergling in zerglings:
+                zergling.delete()
+    if failures:
+        ctx.exit(1)
 
 
 @main.command('reload-zergling')
 @click.argument('zergling')
+@click.option('-w', '--wait', is_flag=True, default=False,
+              help="Wait until the new instance has taken over")
+@click.option('-t', '--timeout', type=float, default=None,
+              help="Maximum number of seconds to wait")
 @click.pass_context
-def reload_zergling(ctx, zergling):
+def reload_zergling(ctx, zergling, wait, timeout):
     overlord, zergling = parse_alias(zergling)
     try:
-        ctx.obj.uwsgi.Overlord(overlord).zergling(zergling).reload()
+        duration = ctx.obj.uwsgi.Overlord(overlord).zergling(zergling).reload(
+            wait=wait, timeout=timeout)
     except score.uwsgi.NoSuchZergling:
         raise click.ClickException('No zergling with that name.')
+    except score.uwsgi.NotRunning:
+        raise click.ClickException('Zergling not running.')
     except score.uwsgi.AlreadyReloading:
         raise click.ClickException('That zergling is already reloading')
+    except score.uwsgi.Timeout:
+        raise click.ClickException('Timeout waiting for reload to finish')
+    if wait:
+        print('Reloaded %s/%s in %.3fs' % (overlord, zergling, duration))
+
+
+@main.command('rolling-reload')
+@click.argument('overlord')
+@click.option('-p', '--max-parallel', type=int, default=1,
+              help="Maximum number of zerglings to reload at once")
+@click.option('-m', '--min-available', type=int, default=0,
+              help="Minimum number of workers that must remain available")
+@click.option('-t', '--timeout', type=float, default=None,
+              help="Maximum number of seconds to wait for each batch "
+              "(defaults to the command_timeout)")
+@click.pass_context
+def rolling_reload(ctx, overlord, max_parallel, min_available, timeout):
+    """
+    Reloads all zerglings of an overlord in batches.
+    """
+    overlord = ctx.obj.uwsgi.Overlord(overlord)
+    try:
+        durations = overlord.rolling_reload(
+            max_parallel=max_parallel, min_available=min_available,
+            timeout=timeout)
+    except score.uwsgi.InsufficientCapacity as e:
+        raise click.ClickException(str(e))
+    except score.uwsgi.Timeout:
+        raise click.ClickException('Timeout waiting for reload to finish')
+    skipped = False
+    for name, duration in durations.items():
+        if duration is None:
+            click.echo('Skipped %s/%s: not responding' % (overlord.name, name),
+                       err=True)
+            skipped = True
+        else:
+            print('Reloaded %s/%s in %.3fs' % (overlord.name, name, duration))
+    if skipped:
+        ctx.exit(1)
+
+
+@main.command('export')
+@click.option('-l', '--listen', default='127.0.0.1:9117',
+              help="host:port or path to a unix socket to serve metrics on")
+@click.option('-i', '--interval', type=float, default=5.0,
+              help="Seconds between two polls")
+@click.pass_context
+def export(ctx, listen, interval):
+    """
+    Serves metrics of all processes in the Prometheus text format.
+    """
+    from score.uwsgi.exporter import Exporter
+    exporter = Exporter(ctx.obj.uwsgi, listen, interval=interval)
+    try:
+        exporter.run()
+    except KeyboardInterrupt:
+        pass
+
+
+@main.command('health')
+@click.option('-l', '--listen', default='127.0.0.1:9118',
+              help="host:port or path to a unix socket to serve checks on")
+@click.option('-i', '--interval', type=float, default=1.0,
+              help="Seconds between two refreshes of the state")
+@click.pass_context
+def health(ctx, listen, interval):
+    """
+    Answers health checks like "GET /myapp?min=2" with 200 if the overlord
+    has at least that many available zerglings, or 503 otherwise.
+    """
+    from score.uwsgi.health import HealthChecker
+    checker = HealthChecker(ctx.obj.uwsgi, listen, interval=interval)
+    try:
+        checker.run()
+    except KeyboardInterrupt:
+        pass
+
+
+@main.command('collect')
+@click.option('-i', '--interval', type=float, default=1.0,
+              help="Seconds between two polls")
+@click.option('-c', '--capacity', type=int, default=1024,
+              help="Number of processes the shared file can hold initially")
+@click.pass_context
+def collect(ctx, interval, capacity):
+    """
+    Publishes the statistics of all processes in a shared file below the
+    rootdir, which can be read without touching the statistics sockets.
+    """
+    from score.uwsgi.shm import Publisher
+    publisher = Publisher(ctx.obj.uwsgi, interval=interval,
+                          capacity=capacity)
+    try:
+        publisher.run()
+    except BlockingIOError:
+        raise click.ClickException('Another collector is already running')
+    except KeyboardInterrupt:
+        pass
+
+
+@main.command('watch')
+@click.argument('overlords', nargs=-1)
+@click.pass_context
+def watch(ctx, overlords):
+    """
+    Prints state changes of the zerglings of all (or given) overlords.
+    """
+    from score.uwsgi.watch import Watcher
+    if overlords:
+        overlords = [ctx.obj.uwsgi.Overlord(name) for name in overlords]
+    else:
+        overlords = ctx.obj.uwsgi.Overlord.discover()
+    watcher = Watcher(overlords)
+
+    @watcher.subscribe
+    def report(change):
+        print('%s/%s: %s -> %s' % (
+            change.zergling.overlord.name, change.zergling.name,
+            change.old or '-', change.new or 'removed'), flush=True)
+
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+
+
+@main.command('daemon')
+@click.pass_context
+def daemon(ctx):
+    """
+    Executes the commands of all clients using this configuration file.
+    """
+    from score.uwsgi.daemon import ControlDaemon
+    control = ControlDaemon(ctx.parent.params['conf'], main)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        control.run()
+    except (RuntimeError, PermissionError) as e:
+        raise click.ClickException(str(e))
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == '__main__':
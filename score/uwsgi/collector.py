@@ -0,0 +1,115 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+#: Upper bound for the number of threads started by :func:`.gather`.
+MAX_WORKERS = 128
+
+
+class Result:
+    """
+    The outcome of a single call performed by :func:`.gather`: either the
+    returned *value* or the raised *error*, as well as the *duration* of the
+    call in seconds.
+    """
+
+    __slots__ = ('value', 'error', 'duration')
+
+    def __init__(self, value=None, error=None, duration=0.0):
+        self.value = value
+        self.error = error
+        self.duration = duration
+
+    @property
+    def ok(self):
+        """
+        Whether the call returned without raising an exception.
+        """
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return '<Result %r>' % (self.value,)
+        return '<Result error=%r>' % (self.error,)
+
+
+def gather(func, items, *, max_workers=None):
+    """
+    Calls *func* with every entry of *items* concurrently and returns an
+    :class:`collections.OrderedDict` mapping each item to its
+    :class:`.Result`. The order of the mapping is the order of *items*.
+    """
+    items = list(items)
+    results = OrderedDict((item, None) for item in items)
+    if not items:
+        return results
+
+    def call(item):
+        start = time.monotonic()
+        try:
+            value = func(item)
+        except Exception as e:
+            return Result(error=e, duration=time.monotonic() - start)
+        return Result(value=value, duration=time.monotonic() - start)
+
+    if max_workers is None:
+        max_workers = min(len(items), MAX_WORKERS)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for item, result in zip(items, executor.map(call, items)):
+            results[item] = result
+    return results
+
+
+def collect_stats(processes, *, timeout=None, fields=None, snapshot=False,
+                  max_workers=None):
+    """
+    Reads the statistics of all given :class:`processes
+    <score.uwsgi.process.UwsgiProcess>` concurrently, applying *timeout* to
+    each socket individually. The complete statistics are read, unless they
+    are restricted to a list of *fields* (see
+    :meth:`.UwsgiProcess.read_stats`).
+
+    If *snapshot* is truthy, the *fields* are ignored and the snapshot of
+    every process is refreshed instead (see
+    :meth:`.UwsgiProcess.refresh_snapshot`), so subsequent calls to
+    predicates like :meth:`.UwsgiProcess.is_running` will not touch the
+    sockets again.
+
+    The return value is the same as with :func:`.gather`, i.e. each process
+    is mapped to a :class:`.Result` containing either the statistics or the
+    error, which will usually be a :class:`.NotRunning` exception.
+    """
+    if snapshot:
+        def read(process):
+            return process.refresh_snapshot(timeout=timeout)
+    else:
+        def read(process):
+            return process.read_stats(timeout=timeout, fields=fields)
+    return gather(read, processes, max_workers=max_workers)
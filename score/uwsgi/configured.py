@@ -0,0 +1,125 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+The :class:`configuration object <score.init.ConfiguredModule>` of this
+module. It lives in its own module, so that importing :mod:`score.uwsgi`
+does not load :mod:`score.init` and the process management code.
+"""
+
+import os
+from score.init import ConfiguredModule
+from .collector import collect_stats
+from .process import UwsgiProcess, Overlord, Zergling
+
+
+class ConfiguredUwsgiModule(ConfiguredModule):
+    """
+    This module's :class:`configuration object
+    <score.init.ConfiguredModule>`.
+    """
+
+    def __init__(self, rootdir, *,
+                 stats_ttl=UwsgiProcess.stats_ttl,
+                 stats_connect_timeout=UwsgiProcess.stats_connect_timeout,
+                 stats_read_timeout=UwsgiProcess.stats_read_timeout,
+                 stats_max_size=UwsgiProcess.stats_max_size,
+                 command_timeout=UwsgiProcess.command_timeout,
+                 drain_timeout=UwsgiProcess.drain_timeout,
+                 cpu_affinity=UwsgiProcess.cpu_affinity):
+        super().__init__(__package__)
+        self.rootdir = rootdir
+        self.stats_ttl = stats_ttl
+        self.stats_connect_timeout = stats_connect_timeout
+        self.stats_read_timeout = stats_read_timeout
+        self.stats_max_size = stats_max_size
+        self.command_timeout = command_timeout
+        self.drain_timeout = drain_timeout
+        self.cpu_affinity = cpu_affinity
+        conf = self
+
+        class ConfiguredProcess:
+            stats_ttl = conf.stats_ttl
+            stats_connect_timeout = conf.stats_connect_timeout
+            stats_read_timeout = conf.stats_read_timeout
+            stats_max_size = conf.stats_max_size
+            command_timeout = conf.command_timeout
+            drain_timeout = conf.drain_timeout
+            cpu_affinity = conf.cpu_affinity
+
+        class ConfiguredOverlord(ConfiguredProcess, Overlord):
+
+            @classmethod
+            def instances(cls, *, timeout=None):
+                overlords = cls.discover()
+                for overlord, result in collect_stats(
+                        overlords, timeout=timeout, snapshot=True).items():
+                    if result.ok:
+                        yield overlord
+
+            @classmethod
+            def discover(cls):
+                folders = sorted(os.listdir(conf.rootdir))
+                return [cls(folder) for folder in folders
+                        if os.path.isdir(os.path.join(conf.rootdir, folder))]
+
+            def __init__(self, *args, **kwargs):
+                self.conf = conf
+                super().__init__(*args, **kwargs)
+
+        class ConfiguredZergling(ConfiguredProcess, Zergling):
+
+            def __init__(self, *args, **kwargs):
+                self.conf = conf
+                super().__init__(*args, **kwargs)
+
+        self.Overlord = ConfiguredOverlord
+        self.Zergling = ConfiguredZergling
+
+    def collect_stats(self, *, timeout=None, fields=None, snapshot=False):
+        """
+        Reads the statistics of all overlords below :attr:`rootdir` and their
+        zerglings concurrently. See :func:`score.uwsgi.collector.collect_stats`
+        for the return value. The mapping will contain each overlord, followed
+        by its zerglings. The *fields* and *snapshot* are passed on
+        unchanged.
+        """
+        processes = []
+        for overlord in self.Overlord.discover():
+            processes.append(overlord)
+            processes.extend(overlord.zerglings())
+        return collect_stats(processes, timeout=timeout, fields=fields,
+                             snapshot=snapshot)
+
+    def stats_reader(self):
+        """
+        Returns a :class:`~score.uwsgi.shm.StatsReader` for the statistics
+        published below :attr:`rootdir` by a
+        :class:`~score.uwsgi.shm.Publisher` (see the ``collect`` command).
+        """
+        from .shm import StatsReader, path
+        return StatsReader(path(self.rootdir))
@@ -0,0 +1,194 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+The client side of the :mod:`.daemon`: a long-lived control daemon keeps the
+configuration of this module loaded and executes command lines of the
+:mod:`.cli` on behalf of clients.
+
+The daemon listens on a unix domain socket, whose path is derived from the
+configuration file (see :func:`.socket_path`). A client sends a single line
+containing a JSON object with the keys ``argv`` (the command line following
+the configuration file) and ``cwd`` (the client's working directory) and
+receives a single line containing a JSON object with the keys ``status``,
+``stdout`` and ``stderr``.
+
+The socket lives in a folder only accessible to the current user (see
+:func:`.socket_folder`) and clients only talk to sockets owned by
+themselves, since a daemon sees the command lines of its clients and
+controls their output.
+
+This module is imported by every invocation of the command line interface
+and thus only imports what a client needs.
+"""
+
+import hashlib
+import json
+import os
+import socket
+import stat
+
+#: Commands, that run until interrupted or wait for processes to change
+#: their state, and are thus always executed in the calling process. The
+#: daemon executes one command at a time, so such a command would block all
+#: other clients.
+LOCAL_COMMANDS = (
+    'daemon', 'autoscale', 'export', 'watch', 'collect', 'health',
+    'rolling-reload')
+
+#: Options, that make a command run until interrupted or wait for processes.
+LOCAL_OPTIONS = {
+    'stats': ('-w', '--watch', '-r', '--rate'),
+    'pause-zergling': ('-w', '--wait'),
+    'resume-zergling': ('-w', '--wait'),
+    'reload-zergling': ('-w', '--wait'),
+    'kill-zergling': ('-d', '--drain'),
+}
+
+
+def runs_locally(argv):
+    """
+    Whether the command line *argv* must be executed in the calling process
+    instead of being forwarded to the daemon.
+    """
+    if argv[0] in LOCAL_COMMANDS:
+        return True
+    options = LOCAL_OPTIONS.get(argv[0], ())
+    for arg in argv[1:]:
+        if arg == '--':
+            break
+        if arg.startswith('--'):
+            if arg.split('=', 1)[0] in options:
+                return True
+        elif arg.startswith('-'):
+            # combined short options, like -wr
+            if any('-' + char in options for char in arg[1:]):
+                return True
+    return False
+
+
+def socket_folder():
+    """
+    Returns the folder containing the control sockets of the current user:
+    ``$XDG_RUNTIME_DIR`` if it is set, or a folder named after the user id in
+    ``$TMPDIR`` (or ``/tmp``) otherwise. See :func:`.check_folder` for the
+    requirements of this folder.
+    """
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime:
+        return runtime
+    return os.path.join(os.environ.get('TMPDIR') or '/tmp',
+                        'score.uwsgi-%d' % os.getuid())
+
+
+def check_folder(folder, *, create=False):
+    """
+    Makes sure the *folder* is a real directory, which is owned by the
+    current user and not accessible to anyone else. It is created with these
+    properties if it does not exist and *create* is truthy. Raises
+    :class:`PermissionError` if the folder does not meet these requirements.
+    """
+    if create:
+        try:
+            os.mkdir(folder, 0o700)
+        except FileExistsError:
+            pass
+    info = os.lstat(folder)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or \
+            info.st_mode & 0o077:
+        raise PermissionError(
+            'Control socket folder %s must be a directory owned by uid %d '
+            'with mode 0700' % (folder, os.getuid()))
+
+
+def socket_path(conffile):
+    """
+    Returns the path of the control socket of the daemon serving given
+    configuration file. The socket is placed in the :func:`.socket_folder`
+    and its name is unique per configuration file.
+    """
+    key = os.path.abspath(conffile).encode('UTF-8')
+    digest = hashlib.sha1(key).hexdigest()[:16]
+    return os.path.join(socket_folder(), 'score.uwsgi-%s.sock' % digest)
+
+
+def is_trusted(path):
+    """
+    Whether *path* is a socket owned by the current user in a folder passing
+    :func:`.check_folder`.
+    """
+    try:
+        check_folder(os.path.dirname(path))
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(info.st_mode) and info.st_uid == os.getuid()
+
+
+def forward(conffile, argv, *, timeout=None):
+    """
+    Executes a command line on the daemon serving *conffile* and returns its
+    response. Returns `None` if no daemon is running, or if the socket is not
+    :func:`trusted <.is_trusted>`, in which case the command was not
+    executed.
+
+    Raises :class:`ConnectionError` if the daemon went away without
+    answering. The command may or may not have been executed in that case.
+    """
+    path = socket_path(conffile)
+    if not is_trusted(path):
+        return None
+    request = json.dumps({'argv': list(argv), 'cwd': os.getcwd()})
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+        sock.settimeout(timeout)
+        sock.sendall(request.encode('UTF-8') + b'\n')
+        with sock.makefile('rb') as fp:
+            line = fp.readline()
+    if not line:
+        raise ConnectionError('Control daemon closed the connection')
+    return json.loads(line.decode('UTF-8'))
+
+
+def ping(path):
+    """
+    Checks whether a daemon is answering on the :func:`trusted
+    <.is_trusted>` socket at *path*.
+    """
+    if not is_trusted(path):
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(1)
+        try:
+            sock.connect(path)
+            sock.sendall(b'{"argv": ["ping"]}\n')
+            return bool(sock.recv(1))
+        except OSError:
+            return False
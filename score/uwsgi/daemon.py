@@ -0,0 +1,190 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+The server side of the control daemon. See :mod:`.control` for the protocol
+and the client.
+"""
+
+import click
+import contextlib
+import io
+import json
+import logging
+import os
+import socketserver
+import tempfile
+import traceback
+
+from .control import check_folder, ping, socket_path
+
+log = logging.getLogger(__name__)
+
+#: Maximum size of a request line in bytes.
+MAX_REQUEST_SIZE = 1024 * 1024
+
+
+class ControlDaemon:
+    """
+    Executes command lines of given click *command* with a pre-loaded
+    configuration. The configuration is re-loaded whenever the modification
+    time of *conffile* changes.
+
+    Commands are executed one after another, since they share the process'
+    working directory and standard streams.
+    """
+
+    def __init__(self, conffile, command, *, path=None):
+        self.conffile = os.path.abspath(conffile)
+        self.command = command
+        self.path = path or socket_path(conffile)
+        self._score = None
+        self._mtime = None
+        self._server = None
+
+    @property
+    def score(self):
+        """
+        The :class:`score.init.ConfiguredScore` of the configuration file.
+        """
+        mtime = os.stat(self.conffile).st_mtime_ns
+        if self._score is None or mtime != self._mtime:
+            from score.init import init_from_file
+            log.info('Loading %s' % self.conffile)
+            self._score = init_from_file(self.conffile)
+            self._mtime = mtime
+        return self._score
+
+    def execute(self, argv, cwd=None):
+        """
+        Executes a command line and returns the response to send to the
+        client.
+        """
+        stdout, stderr = _capture(), _capture()
+        oldcwd = os.getcwd()
+        try:
+            if cwd:
+                os.chdir(cwd)
+            with contextlib.redirect_stdout(stdout), \
+                    contextlib.redirect_stderr(stderr):
+                status = self._invoke(argv)
+        finally:
+            os.chdir(oldcwd)
+        return {
+            'status': status,
+            'stdout': _consume(stdout),
+            'stderr': _consume(stderr),
+        }
+
+    def _invoke(self, argv):
+        try:
+            result = self.command.main(
+                args=[self.conffile] + list(argv), obj=self.score,
+                prog_name=self.command.name, standalone_mode=False)
+        except click.ClickException as e:
+            e.show()
+            return e.exit_code
+        except click.Abort:
+            click.echo('Aborted!', err=True)
+            return 1
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else int(bool(e.code))
+        except Exception:
+            traceback.print_exc()
+            return 1
+        return result if isinstance(result, int) else 0
+
+    def run(self):
+        """
+        Serves requests until :meth:`.stop` is called. Raises
+        :class:`RuntimeError` if another daemon is already serving the
+        configuration file and :class:`PermissionError` if the folder of the
+        socket is accessible to other users (see
+        :func:`~score.uwsgi.control.check_folder`).
+        """
+        check_folder(os.path.dirname(self.path), create=True)
+        if ping(self.path):
+            raise RuntimeError('Control daemon already running on %s' %
+                               self.path)
+        self.score  # fail early on configuration errors
+        self._server = ControlServer(self.path, ControlHandler)
+        self._server.control = self
+        log.info('Listening on %s' % self.path)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def stop(self):
+        """
+        Makes :meth:`.run` return after the current request.
+        """
+        if self._server:
+            self._server.shutdown()
+
+
+class ControlServer(socketserver.UnixStreamServer):
+
+    def server_bind(self):
+        try:
+            os.remove(self.server_address)
+        except FileNotFoundError:
+            pass
+        super().server_bind()
+        os.chmod(self.server_address, 0o600)
+
+
+class ControlHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline(MAX_REQUEST_SIZE)
+        try:
+            request = json.loads(line.decode('UTF-8'))
+            argv = [str(arg) for arg in request['argv']]
+        except (ValueError, KeyError, TypeError):
+            return
+        if argv[:1] == ['ping']:
+            response = {'status': 0, 'stdout': '', 'stderr': ''}
+        else:
+            response = self.server.control.execute(argv, request.get('cwd'))
+        self.wfile.write(json.dumps(response).encode('UTF-8') + b'\n')
+
+
+def _capture():
+    # a real file, so it can be handed to subprocesses as stdout/stderr
+    return io.TextIOWrapper(tempfile.TemporaryFile(), encoding='UTF-8',
+                            write_through=True)
+
+
+def _consume(stream):
+    with stream:
+        stream.seek(0)
+        return stream.read()
@@ -0,0 +1,247 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+A long-running exporter that polls the statistics of all processes below a
+rootdir and publishes them in the `Prometheus text format`_.
+
+.. _Prometheus text format:
+    https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+
+from collections import OrderedDict
+import logging
+import os
+import threading
+import time
+
+from .collector import collect_stats
+from .httpd import RequestHandler, make_server
+
+log = logging.getLogger(__name__)
+
+#: The statistics fields read on every poll.
+FIELDS = (
+    'listen_queue', 'listen_queue_errors', 'pid',
+    'workers[*].id', 'workers[*].pid', 'workers[*].status',
+    'workers[*].requests', 'workers[*].exceptions', 'workers[*].avg_rt',
+    'workers[*].rss',
+)
+
+#: Name, type and help text of all exported metrics.
+METRICS = OrderedDict([
+    ('uwsgi_up', (
+        'gauge', 'Whether the process answered on its statistics socket.')),
+    ('uwsgi_listen_queue', (
+        'gauge', 'Number of connections waiting in the listen queue.')),
+    ('uwsgi_listen_queue_delta', (
+        'gauge', 'Change of the listen queue since the previous poll.')),
+    ('uwsgi_listen_queue_errors_total', (
+        'counter', 'Number of listen queue overflows.')),
+    ('uwsgi_worker_busy', (
+        'gauge', 'Whether the worker is currently handling a request.')),
+    ('uwsgi_worker_paused', (
+        'gauge', 'Whether the worker is currently paused.')),
+    ('uwsgi_worker_requests_total', (
+        'counter', 'Number of requests handled by the worker.')),
+    ('uwsgi_worker_request_rate', (
+        'gauge', 'Requests per second handled since the previous poll.')),
+    ('uwsgi_worker_exceptions_total', (
+        'counter', 'Number of exceptions raised in the worker.')),
+    ('uwsgi_worker_avg_response_time_seconds', (
+        'gauge', 'Average response time of the worker.')),
+    ('uwsgi_worker_rss_bytes', (
+        'gauge', 'Resident set size of the worker.')),
+])
+
+
+class Exporter:
+    """
+    Polls all overlords and zerglings of a :class:`ConfiguredUwsgiModule
+    <score.uwsgi.ConfiguredUwsgiModule>` every *interval* seconds and serves
+    the resulting metrics via HTTP on given *address* (see
+    :func:`score.uwsgi.httpd.make_server`).
+
+    The list of processes is re-used until the contents of the rootdir or one
+    of the overlords' ini files change.
+    """
+
+    def __init__(self, conf, address, *, interval=5.0, timeout=None):
+        self.conf = conf
+        self.address = address
+        self.interval = interval
+        self.timeout = timeout
+        self.metrics = b''
+        self._processes = []
+        self._discovery_key = None
+        self._previous = {}
+        self._stop = threading.Event()
+
+    def discover(self):
+        """
+        Returns all processes to poll, re-using the result of the previous
+        call if nothing has changed in the meantime.
+        """
+        overlords = self.conf.Overlord.discover()
+        key = []
+        for overlord in overlords:
+            try:
+                stat = os.stat(overlord.inifile)
+                key.append((overlord.name, stat.st_ino, stat.st_mtime_ns))
+            except FileNotFoundError:
+                key.append((overlord.name, None, None))
+        if key != self._discovery_key:
+            log.debug('Discovering processes below %s' % self.conf.rootdir)
+            processes = []
+            for overlord in overlords:
+                processes.append(overlord)
+                processes.extend(overlord.zerglings())
+            self._processes = processes
+            self._discovery_key = key
+        return self._processes
+
+    def poll(self):
+        """
+        Reads the statistics of all processes and updates :attr:`.metrics`.
+        """
+        now = time.monotonic()
+        results = collect_stats(self.discover(), timeout=self.timeout,
+                                fields=FIELDS)
+        samples = OrderedDict((name, []) for name in METRICS)
+        current = {}
+        for process, result in results.items():
+            labels = self._labels(process)
+            samples['uwsgi_up'].append((labels, int(result.ok)))
+            if not result.ok:
+                continue
+            stats = result.value
+            current[str(process)] = (now, stats)
+            previous = self._previous.get(str(process))
+            self._process_samples(samples, labels, stats, previous, now)
+        self._previous = current
+        self.metrics = self.render(samples).encode('UTF-8')
+
+    def _process_samples(self, samples, labels, stats, previous, now):
+        queue = stats.get('listen_queue', 0)
+        samples['uwsgi_listen_queue'].append((labels, queue))
+        samples['uwsgi_listen_queue_errors_total'].append(
+            (labels, stats.get('listen_queue_errors', 0)))
+        previous_workers = {}
+        if previous:
+            elapsed = now - previous[0]
+            previous_stats = previous[1]
+            samples['uwsgi_listen_queue_delta'].append(
+                (labels, queue - previous_stats.get('listen_queue', 0)))
+            previous_workers = dict(
+                ((w['id'], w['pid']), w)
+                for w in previous_stats.get('workers', []))
+        for worker in stats.get('workers', []):
+            worker_labels = labels + (('worker', worker['id']),)
+            samples['uwsgi_worker_busy'].append(
+                (worker_labels, int(worker['status'] == 'busy')))
+            samples['uwsgi_worker_paused'].append(
+                (worker_labels, int(worker['status'] == 'pause')))
+            samples['uwsgi_worker_requests_total'].append(
+                (worker_labels, worker['requests']))
+            samples['uwsgi_worker_exceptions_total'].append(
+                (worker_labels, worker['exceptions']))
+            samples['uwsgi_worker_avg_response_time_seconds'].append(
+                (worker_labels, worker['avg_rt'] / 1000000))
+            samples['uwsgi_worker_rss_bytes'].append(
+                (worker_labels, worker['rss']))
+            old = previous_workers.get((worker['id'], worker['pid']))
+            if old is not None and elapsed > 0:
+                delta = max(0, worker['requests'] - old['requests'])
+                samples['uwsgi_worker_request_rate'].append(
+                    (worker_labels, delta / elapsed))
+
+    def _labels(self, process):
+        if hasattr(process, 'overlord'):
+            return (('overlord', process.overlord.name),
+                    ('process', 'zergling-%s' % process.name))
+        return (('overlord', process.name), ('process', 'overlord'))
+
+    def render(self, samples):
+        """
+        Converts the collected *samples* to the Prometheus text format.
+        """
+        lines = []
+        for name, values in samples.items():
+            if not values:
+                continue
+            type_, help = METRICS[name]
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, type_))
+            for labels, value in values:
+                labels = ','.join('%s="%s"' % (k, _escape(v))
+                                  for k, v in labels)
+                lines.append('%s{%s} %s' % (name, labels, value))
+        lines.append('')
+        return '\n'.join(lines)
+
+    def run(self):
+        """
+        Serves the metrics and polls the statistics until :meth:`.stop` is
+        called.
+        """
+        server = make_server(self.address, MetricsHandler)
+        server.exporter = self
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        log.info('Exporting metrics on %s' % self.address)
+        try:
+            while not self._stop.is_set():
+                start = time.monotonic()
+                try:
+                    self.poll()
+                except Exception:
+                    log.exception('Error polling statistics')
+                elapsed = time.monotonic() - start
+                self._stop.wait(max(0, self.interval - elapsed))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def stop(self):
+        """
+        Makes :meth:`.run` return after the current poll.
+        """
+        self._stop.set()
+
+
+class MetricsHandler(RequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+            self.respond(404, b'Not Found\n')
+            return
+        self.respond(200, self.server.exporter.metrics,
+                     'text/plain; version=0.0.4; charset=utf-8')
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"')
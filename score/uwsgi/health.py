@@ -0,0 +1,169 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+A small HTTP server answering health checks of load balancers. It tells
+whether an overlord has at least a given number of zerglings, that are
+accepting requests, from state refreshed in the background::
+
+    $ curl -i http://127.0.0.1:9118/myapp?min=2
+    HTTP/1.1 200 OK
+    ...
+    3 zerglings available (2 required)
+
+The status is ``503`` if there are fewer zerglings, if the overlord is not
+running or if the state could not be refreshed for a while.
+"""
+
+import logging
+import threading
+import time
+from urllib.parse import parse_qs
+
+from .collector import collect_stats
+from .httpd import RequestHandler, make_server
+
+log = logging.getLogger(__name__)
+
+#: The statistics fields read on every refresh.
+FIELDS = ('workers[*].status',)
+
+
+class HealthChecker:
+    """
+    Counts the available zerglings of every running overlord of a
+    :class:`ConfiguredUwsgiModule <score.uwsgi.ConfiguredUwsgiModule>` every
+    *interval* seconds and answers health checks via HTTP on given *address*
+    (see :func:`score.uwsgi.httpd.make_server`).
+
+    A zergling is available if it answered on its statistics socket, is
+    neither starting nor reloading and has at least one worker that is
+    neither paused nor cheaped.
+    """
+
+    def __init__(self, conf, address, *, interval=1.0, timeout=None):
+        self.conf = conf
+        self.address = address
+        self.interval = interval
+        self.timeout = timeout
+        #: Maps the names of all running overlords to their number of
+        #: available zerglings.
+        self.counts = {}
+        #: The :func:`time.monotonic` value of the last successful refresh.
+        self.refreshed = None
+        self._stop = threading.Event()
+
+    def refresh(self):
+        """
+        Re-counts the available zerglings of all running overlords and
+        replaces :attr:`.counts`.
+        """
+        counts = {}
+        zerglings = []
+        for overlord in self.conf.Overlord.instances(timeout=self.timeout):
+            counts[overlord.name] = 0
+            zerglings.extend(overlord.zerglings())
+        results = collect_stats(zerglings, timeout=self.timeout,
+                                fields=FIELDS)
+        for zergling, result in results.items():
+            if result.ok and _available(zergling, result.value):
+                counts[zergling.overlord.name] += 1
+        self.counts = counts
+        self.refreshed = time.monotonic()
+
+    def check(self, overlord, minimum=1):
+        """
+        Returns an HTTP status code and a message telling whether the
+        *overlord* with given name has at least *minimum* available
+        zerglings.
+        """
+        refreshed = self.refreshed
+        if refreshed is None:
+            return 503, 'starting up'
+        if time.monotonic() - refreshed > 3 * self.interval + 1:
+            return 503, 'state is stale'
+        count = self.counts.get(overlord)
+        if count is None:
+            return 503, 'overlord not running'
+        message = '%d zerglings available (%d required)' % (count, minimum)
+        return (200 if count >= minimum else 503), message
+
+    def run(self):
+        """
+        Serves health checks and refreshes the state until :meth:`.stop` is
+        called.
+        """
+        server = make_server(self.address, HealthHandler)
+        server.checker = self
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        log.info('Answering health checks on %s' % self.address)
+        try:
+            while not self._stop.is_set():
+                start = time.monotonic()
+                try:
+                    self.refresh()
+                except Exception:
+                    log.exception('Error refreshing health state')
+                elapsed = time.monotonic() - start
+                self._stop.wait(max(0, self.interval - elapsed))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def stop(self):
+        """
+        Makes :meth:`.run` return after the current refresh.
+        """
+        self._stop.set()
+
+
+class HealthHandler(RequestHandler):
+
+    # keep connections of frequent probes open
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        overlord = path.strip('/')
+        if not overlord or '/' in overlord:
+            self.respond(404, b'Not Found\n')
+            return
+        try:
+            minimum = int(parse_qs(query).get('min', ['1'])[0])
+        except ValueError:
+            self.respond(400, b'Invalid minimum\n')
+            return
+        status, message = self.server.checker.check(overlord, minimum)
+        self.respond(status, message.encode('UTF-8') + b'\n')
+
+
+def _available(zergling, stats):
+    if zergling.is_starting() or zergling.is_reloading():
+        return False
+    return any(worker['status'] not in ('pause', 'cheap')
+               for worker in stats.get('workers', []))
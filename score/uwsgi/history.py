@@ -0,0 +1,147 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+Fixed-memory histories of process statistics. A :class:`.History` keeps the
+last samples of a process in a ring buffer of :class:`array.array` columns,
+so it can be fed for as long as the process lives without growing.
+
+A process feeds its history on every complete :meth:`read
+<score.uwsgi.process.UwsgiProcess.read_stats>` of its statistics, once it
+was assigned one::
+
+    zergling.history = History(size=60)
+    while True:
+        zergling.read_stats()
+        print(zergling.history.rate('requests'))
+        time.sleep(1)
+"""
+
+from array import array
+from collections import namedtuple
+import time
+
+#: The columns of a sample. The number of *requests* and *exceptions* are
+#: counters summed over all workers, *avg_rt* is the average response time
+#: of all workers in microseconds, weighted by their number of requests, and
+#: *rss* is the sum of the workers' resident set sizes in bytes.
+COLUMNS = ('time', 'requests', 'exceptions', 'avg_rt', 'rss',
+           'listen_queue')
+
+#: The columns, that only ever grow while a process is running.
+COUNTERS = ('requests', 'exceptions')
+
+Sample = namedtuple('Sample', COLUMNS)
+
+
+class History:
+    """
+    A ring buffer holding the last *size* :class:`Samples <.Sample>` of a
+    process. The memory footprint is fixed at ``8 * len(COLUMNS) * size``
+    bytes.
+    """
+
+    def __init__(self, size=600):
+        if size < 2:
+            raise ValueError('A history needs room for at least two samples')
+        self.size = size
+        self._columns = tuple(array('d', bytes(8 * size)) for _ in COLUMNS)
+        self._next = 0
+        self._count = 0
+
+    def record(self, stats, timestamp=None):
+        """
+        Appends a sample extracted from given statistics, as returned by
+        :meth:`.UwsgiProcess.read_stats`.
+        """
+        workers = stats.get('workers', [])
+        requests = exceptions = weighted_rt = rss = 0
+        for worker in workers:
+            requests += worker.get('requests', 0)
+            exceptions += worker.get('exceptions', 0)
+            weighted_rt += worker.get('avg_rt', 0) * worker.get('requests', 0)
+            rss += worker.get('rss', 0)
+        avg_rt = weighted_rt / requests if requests else 0
+        if timestamp is None:
+            timestamp = time.time()
+        self.append(Sample(timestamp, requests, exceptions, avg_rt, rss,
+                           stats.get('listen_queue', 0)))
+
+    def append(self, sample):
+        """
+        Appends a :class:`.Sample`, overwriting the oldest one if the buffer
+        is full.
+        """
+        for column, value in zip(self._columns, sample):
+            column[self._next] = value
+        self._next = (self._next + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('history index out of range')
+        position = (self._next - self._count + index) % self.size
+        return Sample(*(column[position] for column in self._columns))
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def column(self, name):
+        """
+        Returns the values of the column with given *name*, oldest first.
+        """
+        column = self._columns[COLUMNS.index(name)]
+        start = (self._next - self._count) % self.size
+        if start + self._count <= self.size:
+            return column[start:start + self._count]
+        return column[start:] + column[:self._next]
+
+    def rate(self, name, span=1):
+        """
+        Returns the per-second change of the column with given *name* between
+        the latest sample and the one *span* samples earlier, or `None` if
+        there are not enough samples. Counters that went backwards, because
+        the process was restarted in between, are treated as if they started
+        at zero.
+        """
+        if span < 1 or span >= self._count:
+            return None
+        newer, older = self[-1], self[-1 - span]
+        elapsed = newer.time - older.time
+        if elapsed <= 0:
+            return None
+        index = COLUMNS.index(name)
+        delta = newer[index] - older[index]
+        if delta < 0 and name in COUNTERS:
+            delta = newer[index]
+        return delta / elapsed
@@ -0,0 +1,101 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+Minimal HTTP server plumbing shared by the long-running services of this
+module, like the :mod:`.exporter`.
+"""
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import os
+import socketserver
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn,
+                              socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        try:
+            os.remove(self.server_address)
+        except FileNotFoundError:
+            pass
+        super().server_bind()
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    Base class for request handlers, that does not log every request and
+    works with unix domain sockets, too.
+    """
+
+    # buffer each response and send it in a single write, since separate
+    # writes for headers and body stall keep-alive connections for tens of
+    # milliseconds (nagle's algorithm meets delayed acks)
+    wbufsize = -1
+
+    def address_string(self):
+        if isinstance(self.client_address, str):
+            return self.client_address or 'unix'
+        return super().address_string()
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self, status, body, content_type='text/plain; charset=utf-8'):
+        """
+        Sends a complete response with given *status* code and *body*, which
+        must be a :class:`bytes` object.
+        """
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+
+def make_server(address, handler):
+    """
+    Creates a threading HTTP server for given *handler* class. The *address*
+    is either a path to a unix domain socket (it must contain a slash, like
+    ``./health.sock``) or a ``host:port`` combination, where the host part is
+    optional and defaults to ``127.0.0.1``.
+    """
+    if '/' in address:
+        return ThreadingUnixHTTPServer(address, handler)
+    host, _, port = address.rpartition(':')
+    return ThreadingHTTPServer((host or '127.0.0.1', int(port)), handler)
@@ -26,13 +26,24 @@
 
 
 from collections import OrderedDict
-
+from contextlib import contextmanager
+import fcntl
+import hashlib
+import marshal
+import os
 import re
+import tempfile
 
 
 NO_VALUE = type('NO_FALLBACK', (object,), {})()
 
 
+_SECTION_NAME = re.compile(r'[^\[\]]+$')
+
+#: Version of the cache file format, see :meth:`.UwsgiIni.load_path`.
+CACHE_VERSION = 2
+
+
 class ParseError(Exception):
     pass
 
@@ -55,8 +66,47 @@ class UwsgiIni:
     unique name.
     """
 
-    def __init__(self):
+    def __init__(self, path=None):
         self.sections = OrderedDict()
+        self.path = path
+
+    @classmethod
+    def load_path(cls, path, *, cache=True):
+        """
+        Creates a :class:`.UwsgiIni` with the contents of the file at *path*,
+        which will be empty if the file does not exist.
+
+        If *cache* is truthy, the parsed configuration is stored in a hidden
+        file next to the ini file (``.uwsgi.ini.cache`` for ``uwsgi.ini``),
+        together with the inode, modification time and size of the ini file
+        and a hash of its contents. Subsequent calls will use the cache
+        without even reading the ini file, if these file attributes did not
+        change. If they did, the contents are hashed and the cache is only
+        discarded if the hash differs.
+        """
+        ini = cls(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return ini
+        if not cache:
+            with open(path) as fp:
+                ini.load(fp)
+            return ini
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached = _read_cache(path)
+        if cached is not None and cached[0] == key:
+            ini._restore(cached[2])
+            return ini
+        with open(path, 'rb') as fp:
+            content = fp.read()
+        digest = hashlib.sha1(content).digest()
+        if cached is not None and cached[1] == digest:
+            ini._restore(cached[2])
+        else:
+            ini.loads(str(content, 'UTF-8'))
+        ini._write_cache(path, key, digest)
+        return ini
 
     def load(self, fp):
         """
@@ -68,32 +118,33 @@ class UwsgiIni:
         """
         Loads the configuration from given *string*.
         """
-        self.sections = OrderedDict()
+        self.sections = sections = OrderedDict()
         section = None
+        pairs = None
+        match_name = _SECTION_NAME.match
         for i, line in enumerate(string.split('\n')):
             line = line.strip()
-            if not line or line.startswith(';'):
+            if not line or line[0] == ';':
                 continue
             if line[0] == '[':
                 if line[-1] != ']':
                     raise ParseError('Line %d starts with bracket, '
                                      'but doesn\'t end in one' % i)
                 name = line[1:-1].strip()
-                if not re.match(r'[a-zA-Z0-9_-]+$', name):
+                if not match_name(name):
                     raise ParseError('Line %d contains invalid section name: %s'
                                      % (i, name))
                 section = UwsgiSection(name)
-                self.sections[name] = section
+                sections[name] = section
+                pairs = section._entries
                 continue
-            if section is None:
+            if pairs is None:
                 raise ParseError('Line %d is outside of any sections' % i)
-            try:
-                k, v = line.split('=', 1)
-                k = k.strip()
-                v = v.strip()
-            except ValueError:
-                k, v = (line, True)
-            section[k] = v
+            k, sep, v = line.partition('=')
+            if sep:
+                pairs.append((k.strip(), v.strip()))
+            else:
+                pairs.append((line, True))
 
     def write(self, fp):
         """
@@ -105,13 +156,121 @@ class UwsgiIni:
         """
         Converts this configuration to string.
         """
-        result = ''
+        parts = []
         for name, section in self.sections.items():
-            result += '[%s]\n' % name
-            for k, v in section:
-                result += '%s = %s\n' % (k, str(v))
-            result += '\n'
-        return result
+            parts.append('[%s]\n' % name)
+            parts.extend(['%s = %s\n' % pair for pair in section._pairs()])
+            parts.append('\n')
+        return ''.join(parts)
+
+    def save(self, path, *, cache=True):
+        """
+        Atomically replaces the file at *path* with this configuration: the
+        data is written to a temporary file in the same folder, which is
+        synced to disk and then renamed to *path*. Readers will thus either
+        see the old or the new file, but never a partially written one.
+
+        Will also update the cache file described in :meth:`.load_path`,
+        unless *cache* is falsy.
+        """
+        folder, name = os.path.split(os.path.abspath(path))
+        content = self.dumps().encode('UTF-8')
+        fd, tmppath = _create_temp(folder, name)
+        try:
+            try:
+                # keep the permissions of the file being replaced
+                os.fchmod(fd, os.stat(path).st_mode & 0o7777)
+            except FileNotFoundError:
+                pass
+            with open(fd, 'wb') as fp:
+                fp.write(content)
+                fp.flush()
+                os.fsync(fp.fileno())
+                stat = os.fstat(fp.fileno())
+            os.replace(tmppath, path)
+        except BaseException:
+            try:
+                os.remove(tmppath)
+            except FileNotFoundError:
+                pass
+            raise
+        dirfd = os.open(folder, os.O_RDONLY)
+        try:
+            os.fsync(dirfd)
+        finally:
+            os.close(dirfd)
+        if cache:
+            key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            # store what parsing the file would yield, i.e. every value
+            # written as "key = value" becomes a stripped string
+            sections = [
+                (name, [(k.strip(), str(v).strip())
+                        for k, v in section._pairs()])
+                for name, section in self.sections.items()]
+            self._write_cache(path, key, hashlib.sha1(content).digest(),
+                              sections)
+
+    def _restore(self, sections):
+        """
+        Replaces the contents of this object with *sections* as stored in a
+        cache file.
+        """
+        self.sections = OrderedDict()
+        for name, pairs in sections:
+            section = UwsgiSection(name)
+            section._entries = pairs
+            self.sections[name] = section
+
+    def _write_cache(self, path, key, digest, sections=None):
+        """
+        Writes the cache file for the ini file at *path*, containing given
+        *sections* (a list of section names and their pairs), which default
+        to the contents of this object. Failures are ignored, since the cache
+        is merely an optimization.
+        """
+        if sections is None:
+            sections = [(name, section._pairs())
+                        for name, section in self.sections.items()]
+        data = (CACHE_VERSION, key, digest, sections)
+        cachefile = _cache_path(path)
+        try:
+            fd, tmppath = tempfile.mkstemp(dir=os.path.dirname(cachefile),
+                                           prefix=os.path.basename(cachefile))
+        except OSError:
+            return
+        try:
+            with open(fd, 'wb') as fp:
+                fp.write(marshal.dumps(data))
+            os.replace(tmppath, cachefile)
+        except (OSError, ValueError):
+            try:
+                os.remove(tmppath)
+            except OSError:
+                pass
+
+    @classmethod
+    @contextmanager
+    def transaction(cls, path):
+        """
+        A context manager for modifying the ini file at *path*. It holds an
+        exclusive lock on a separate lock file (*path* with the suffix
+        ``.lock``) for its whole duration and provides the current contents of
+        the file as :class:`.UwsgiIni`. All changes made to this object are
+        :meth:`saved <.save>` in a single write when the block is left without
+        an exception::
+
+            with UwsgiIni.transaction('/path/to/uwsgi.ini') as ini:
+                del ini['zergling-1']
+                ini['zergling-2']['logdate'] = True
+        """
+        with open(path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                ini = cls.load_path(path)
+                yield ini
+                ini.save(path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
 
     def __getitem__(self, key):
         if key not in self.sections:
@@ -126,56 +285,340 @@ class UwsgiIni:
     def __delitem__(self, key):
         self.sections.pop(key, None)
 
+    def __contains__(self, key):
+        return key in self.sections
+
     def __iter__(self):
         return iter(self.sections)
 
+    def resolve(self, name):
+        """
+        Provides a :class:`.ResolvedSection` for the section with given
+        *name*, i.e. a read-only view on the section as uwsgi would interpret
+        it.
+        """
+        return ResolvedSection(self, name)
+
+
+def _cache_path(path):
+    folder, name = os.path.split(path)
+    return os.path.join(folder, '.%s.cache' % name)
+
+
+def _create_temp(folder, name):
+    """
+    Creates a new temporary file for replacing the file *name* in *folder*
+    and returns its descriptor and path. Unlike :func:`tempfile.mkstemp`,
+    the file receives the permissions a regular new file would get, i.e.
+    0666 reduced by the umask.
+    """
+    while True:
+        path = os.path.join(folder, '.%s.%s' % (name, os.urandom(6).hex()))
+        try:
+            return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                           0o666), path
+        except FileExistsError:
+            continue
+
+
+def _read_cache(path):
+    """
+    Returns the contents of the cache file for the ini file at *path* as a
+    tuple ``(key, digest, sections)``, or `None` if there is no usable cache.
+    """
+    try:
+        with open(_cache_path(path), 'rb') as fp:
+            data = marshal.loads(fp.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(data, tuple) or len(data) != 4 or \
+            data[0] != CACHE_VERSION:
+        return None
+    return data[1:]
+
 
 class UwsgiSection:
     """
     A named section within a :class:`.UwsgiIni`. Behaves very much like an
     :class:`collections.OrderedDict`, but can contain keys multiple times.
+
+    The values of each key are indexed, so that accessing a key does not
+    depend on the size of the section. The index is not used anymore, once
+    the list of :attr:`.pairs` was accessed, since it might be modified.
     """
 
     def __init__(self, name):
         self.name = name
-        self.pairs = []
+        # list of (key, value) tuples in insertion order, where removed
+        # entries are replaced by None until the next _compact()
+        self._entries = []
+        # maps keys to the positions of their entries, built on demand
+        self._index = None
+        self._removed = 0
+        # whether the list of entries was handed out through self.pairs
+        self._exposed = False
+
+    @property
+    def pairs(self):
+        """
+        The list of all (key, value) tuples in this section. Modifications of
+        this list are reflected in the section.
+        """
+        self._compact()
+        self._exposed = True
+        return self._entries
+
+    @pairs.setter
+    def pairs(self, pairs):
+        self._entries = pairs
+        self._index = None
+        self._removed = 0
+        self._exposed = True
+
+    def _pairs(self):
+        if self._removed:
+            self._compact()
+        return self._entries
 
     def __iter__(self):
-        return iter(self.pairs)
+        return (entry for entry in self._entries if entry is not None)
+
+    def __contains__(self, key):
+        return key in self._keys()
 
     def __setitem__(self, key, value):
-        self.pairs.append((key, value))
+        if self._index is not None:
+            self._index.setdefault(key, []).append(len(self._entries))
+        self._entries.append((key, value))
 
     def __getitem__(self, key):
-        for k, v in reversed(self.pairs):
-            if key == k:
-                return v
-        raise KeyError(k)
+        positions = self._keys().get(key)
+        if not positions:
+            raise KeyError(key)
+        return self._entries[positions[-1]][1]
 
     def __delitem__(self, key):
         self.reset(key)
 
     def pop(self, key, fallback=NO_VALUE):
-        for i, (k, v) in reversed(enumerate(self.pairs)):
-            if k == key:
-                del self.pairs[i]
-                return v
-        if fallback != NO_VALUE:
-            return fallback
-        raise KeyError(key)
+        index = self._keys()
+        positions = index.get(key)
+        if not positions:
+            if fallback is not NO_VALUE:
+                return fallback
+            raise KeyError(key)
+        position = positions.pop()
+        if not positions:
+            del index[key]
+        value = self._entries[position][1]
+        self._remove([position])
+        return value
 
     def reset(self, key, value=NO_VALUE):
         """
         Removes all values with given *key*.
         """
-        for i, (k, v) in reversed(enumerate(self.pairs)):
-            if key == k:
-                del self.pairs[i]
-        if value != NO_VALUE:
-            self[k] = v
+        positions = self._keys().pop(key, None)
+        if positions:
+            self._remove(positions)
+        if value is not NO_VALUE:
+            self[key] = value
 
     def get_all(self, key):
         """
         Provides all values for given *key*.
         """
-        return [v for k, v in self.pairs if k == key]
+        entries = self._entries
+        return [entries[i][1] for i in self._keys().get(key, ())]
+
+    def _keys(self):
+        if self._index is None or self._exposed:
+            index = {}
+            for i, entry in enumerate(self._entries):
+                if entry is not None:
+                    index.setdefault(entry[0], []).append(i)
+            self._index = index
+        return self._index
+
+    def _remove(self, positions):
+        if self._exposed:
+            for i in sorted(positions, reverse=True):
+                del self._entries[i]
+            self._index = None
+            return
+        for i in positions:
+            self._entries[i] = None
+        self._removed += len(positions)
+        if self._removed > 16 and self._removed * 2 > len(self._entries):
+            self._compact()
+
+    def _compact(self):
+        self._entries = [e for e in self._entries if e is not None]
+        self._index = None
+        self._removed = 0
+
+
+class ResolvedSection:
+    """
+    A read-only view on a section of a :class:`.UwsgiIni`, that interprets the
+    section the way uwsgi does:
+
+    - The directives ``ini`` and ``include`` are replaced by the contents of
+      the referenced section. Their value has the form ``path:section``,
+      where the section defaults to ``uwsgi`` and the path defaults to the
+      current file. Relative paths are interpreted relative to the folder of
+      the including file.
+    - Placeholders of the form ``%(key)`` are replaced by the (last) value of
+      the given key within this view.
+    - The magic variables ``%d`` (the folder of the file containing the
+      value, with trailing slash), ``%p`` (the absolute path of that file),
+      ``%s`` (its file name), ``%n`` (its file name without extension),
+      ``%x`` (its extension), ``%c`` (the name of its folder) and ``%%`` (a
+      literal percent sign) are expanded.
+
+    Included files are only loaded when the view is first accessed and every
+    value is expanded at most once.
+    """
+
+    def __init__(self, ini, name):
+        self.ini = ini
+        self.name = name
+        self._entries = None
+        self._index = None
+        self._expanded = {}
+        self._expanding = set()
+        self._files = {}
+
+    def __iter__(self):
+        for i, entry in enumerate(self._load()):
+            yield entry[0], self._expand(i)
+
+    def __contains__(self, key):
+        self._load()
+        return key in self._index
+
+    def __getitem__(self, key):
+        self._load()
+        positions = self._index.get(key)
+        if not positions:
+            raise KeyError(key)
+        return self._expand(positions[-1])
+
+    def get_all(self, key):
+        """
+        Provides all expanded values for given *key*.
+        """
+        self._load()
+        return [self._expand(i) for i in self._index.get(key, ())]
+
+    def _load(self):
+        if self._entries is None:
+            entries = []
+            self._flatten(self.ini, self.name, entries, ())
+            index = {}
+            for i, (key, _, _) in enumerate(entries):
+                index.setdefault(key, []).append(i)
+            self._entries = entries
+            self._index = index
+        return self._entries
+
+    def _flatten(self, ini, name, entries, stack):
+        """
+        Appends ``(key, raw value, path of file)`` tuples of the section
+        *name* in *ini* to *entries*, replacing include directives with the
+        contents of the included section.
+        """
+        ident = (ini.path, name)
+        if ident in stack:
+            raise ParseError('Include loop: %s' % ' -> '.join(
+                '%s:%s' % i for i in stack + (ident,)))
+        if name not in ini.sections:
+            raise ParseError('No section %s in %s' % (name, ini.path))
+        for key, value in ini.sections[name]:
+            if key in ('ini', 'include') and isinstance(value, str):
+                path, sep, section = self._expand_magic(
+                    value, ini.path).rpartition(':')
+                if not sep:
+                    path, section = section, 'uwsgi'
+                included = self._open(path, ini.path)
+                self._flatten(included, section or 'uwsgi', entries,
+                              stack + (ident,))
+            else:
+                entries.append((key, value, ini.path))
+
+    def _open(self, path, origin):
+        """
+        Returns the :class:`.UwsgiIni` for *path* as referenced from the file
+        *origin*.
+        """
+        if not path:
+            if origin is None:
+                return self.ini
+            path = origin
+        elif origin is not None:
+            path = os.path.join(os.path.dirname(origin), path)
+        path = os.path.abspath(path)
+        if self.ini.path and path == os.path.abspath(self.ini.path):
+            return self.ini
+        if path not in self._files:
+            if not os.path.exists(path):
+                raise ParseError('Included file not found: %s' % path)
+            # included files are not ours, so don't leave cache files
+            # next to them
+            self._files[path] = UwsgiIni.load_path(path, cache=False)
+        return self._files[path]
+
+    def _expand(self, position):
+        if position in self._expanded:
+            return self._expanded[position]
+        key, value, path = self._entries[position]
+        if isinstance(value, str) and '%' in value:
+            if position in self._expanding:
+                raise ParseError('Placeholder loop in %s' % key)
+            self._expanding.add(position)
+            try:
+                value = _PLACEHOLDER.sub(
+                    lambda match: self._replace(match, path), value)
+            finally:
+                self._expanding.discard(position)
+        self._expanded[position] = value
+        return value
+
+    def _replace(self, match, path):
+        placeholder = match.group(1)
+        if placeholder is None:
+            return _magic(match.group(2), path)
+        positions = self._index.get(placeholder)
+        if not positions:
+            return match.group(0)
+        return str(self._expand(positions[-1]))
+
+    def _expand_magic(self, value, path):
+        return _MAGIC.sub(lambda match: _magic(match.group(1), path), value)
+
+
+_PLACEHOLDER = re.compile(r'%\(([^)]+)\)|%([dpsnxc%])')
+_MAGIC = re.compile(r'%([dpsnxc%])')
+
+
+def _magic(char, path):
+    """
+    Returns the value of the magic variable ``%<char>`` in the file *path*.
+    """
+    if char == '%':
+        return '%'
+    if path is None:
+        return '%' + char
+    path = os.path.abspath(path)
+    folder, filename = os.path.split(path)
+    if char == 'd':
+        return folder + os.sep
+    if char == 'p':
+        return path
+    if char == 's':
+        return filename
+    if char == 'n':
+        return os.path.splitext(filename)[0]
+    if char == 'x':
+        return os.path.splitext(filename)[1].lstrip('.')
+    return os.path.basename(folder)
@@ -0,0 +1,189 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+A thin :mod:`ctypes` wrapper around the linux `inotify`_ API, which is used to
+wait for changes in a process' folder without polling.
+
+.. _inotify: http://man7.org/linux/man-pages/man7/inotify.7.html
+"""
+
+from collections import namedtuple
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+#: The events relevant for tracking the files of uwsgi processes.
+FOLDER_EVENTS = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+                 IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+
+#: The interval used by :func:`.wait_until` if inotify is not available.
+POLL_INTERVAL = 0.1
+
+Event = namedtuple('Event', ('wd', 'mask', 'cookie', 'name'))
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        name = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify not supported')
+        libc.inotify_add_watch.argtypes = (
+            ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        _libc = libc
+    return _libc
+
+
+def available():
+    """
+    Whether inotify can be used on this system.
+    """
+    try:
+        _load_libc()
+        return True
+    except (OSError, AttributeError):
+        return False
+
+
+class Inotify:
+    """
+    An inotify instance. Can be used as a context manager, which will
+    :meth:`close` the underlying file descriptor upon exit.
+    """
+
+    def __init__(self):
+        self._libc = _load_libc()
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path, mask=FOLDER_EVENTS):
+        """
+        Starts watching *path* for given events and returns the watch
+        descriptor.
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def fileno(self):
+        return self.fd
+
+    def read(self, timeout=None):
+        """
+        Waits at most *timeout* seconds for events and returns a list of all
+        pending :class:`Events <.Event>`, which is empty if the timeout was
+        reached.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append(Event(wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def wait_until(folder, predicate, timeout=None):
+    """
+    Blocks until the callable *predicate* returns a truthy value. The
+    predicate is evaluated initially and whenever something changes in given
+    *folder*. Falls back to polling every :data:`.POLL_INTERVAL` seconds if
+    inotify is not available.
+
+    Returns `True` if the predicate was fulfilled, or `False` if *timeout*
+    seconds have passed without that happening.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    def remaining(interval):
+        if deadline is None:
+            return interval
+        return max(0, min(interval, deadline - time.monotonic()))
+
+    if not available():
+        while not predicate():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(remaining(POLL_INTERVAL))
+        return True
+    with Inotify() as inotify:
+        inotify.add_watch(folder)
+        # the predicate is re-evaluated at least once per second, to guard
+        # against changes that cannot be observed in the file system.
+        while not predicate():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            inotify.read(remaining(1.0))
+        return True
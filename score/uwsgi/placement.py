@@ -0,0 +1,249 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+Placement of zerglings on the CPUs of the host. The CPUs available to this
+process are partitioned into one set per zergling, keeping each set within a
+single NUMA node wherever possible, so that the workers of a zergling share
+their caches and allocate memory close to the cores they run on.
+"""
+
+from contextlib import contextmanager
+import glob
+import logging
+import os
+import re
+
+log = logging.getLogger(__name__)
+
+#: The folder containing the NUMA topology of the host.
+NODE_FOLDER = '/sys/devices/system/node'
+
+#: The folder containing the CPU topology of the host.
+CPU_FOLDER = '/sys/devices/system/cpu'
+
+
+def parse_cpulist(value):
+    """
+    Parses a CPU list in the format used by the kernel, like ``0-3,8,10-11``,
+    into a :class:`frozenset` of CPU numbers.
+    """
+    cpus = set()
+    for part in value.strip().split(','):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        try:
+            cpus.update(range(int(first), int(last or first) + 1))
+        except ValueError:
+            raise ValueError('Invalid cpu list %r' % value)
+    return frozenset(cpus)
+
+
+def format_cpulist(cpus):
+    """
+    The inverse of :func:`.parse_cpulist`.
+    """
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(str(first) if first == last else '%d-%d' % (first, last)
+                    for first, last in ranges)
+
+
+def available_cpus():
+    """
+    The CPUs this process may run on.
+    """
+    return frozenset(os.sched_getaffinity(0))
+
+
+def numa_nodes(cpus=None):
+    """
+    Groups given *cpus* (defaulting to the :func:`.available_cpus`) by the
+    NUMA node they belong to and returns a list of non-empty
+    :class:`frozensets <frozenset>`, ordered by node. All CPUs are considered
+    to be in a single node, if the host does not expose its topology.
+    """
+    if cpus is None:
+        cpus = available_cpus()
+    nodes = []
+    remaining = set(cpus)
+    paths = glob.glob(os.path.join(NODE_FOLDER, 'node*', 'cpulist'))
+    for path in sorted(paths, key=_node_number):
+        try:
+            with open(path) as file:
+                node = parse_cpulist(file.read()) & remaining
+        except (OSError, ValueError):
+            continue
+        if node:
+            nodes.append(node)
+            remaining -= node
+    if remaining:
+        nodes.append(frozenset(remaining))
+    return nodes
+
+
+def _node_number(path):
+    match = re.search(r'node(\d+)', path)
+    return int(match.group(1)) if match else -1
+
+
+def partition(count, nodes=None):
+    """
+    Partitions the CPUs of given NUMA *nodes* (as returned by
+    :func:`.numa_nodes`, which is also the default) into *count* CPU sets.
+
+    If there are fewer sets than nodes, each set consists of whole nodes.
+    Otherwise each node receives a number of sets proportional to its size
+    and its CPUs are split evenly among them, keeping hyper-threading
+    siblings together. Sets do not overlap, unless a node receives more sets
+    than it has CPUs: these sets span the whole node instead.
+    """
+    if nodes is None:
+        nodes = numa_nodes()
+    nodes = [node for node in nodes if node]
+    if count <= 0 or not nodes:
+        return []
+    if count <= len(nodes):
+        return [frozenset().union(*nodes[index::count])
+                for index in range(count)]
+    sets = []
+    for node, share in zip(nodes, _apportion(count, nodes)):
+        cpus = _sibling_order(node)
+        if share > len(cpus):
+            sets.extend([node] * share)
+            continue
+        size, extra = divmod(len(cpus), share)
+        start = 0
+        for index in range(share):
+            end = start + size + (1 if index < extra else 0)
+            sets.append(frozenset(cpus[start:end]))
+            start = end
+    return sets
+
+
+def _apportion(count, nodes):
+    """
+    Distributes *count* sets among *nodes* in proportion to their sizes,
+    assigning at least one set to every node.
+    """
+    total = sum(len(node) for node in nodes)
+    spare = count - len(nodes)
+    quotas = [spare * len(node) / total for node in nodes]
+    shares = [1 + int(quota) for quota in quotas]
+    remainders = sorted(range(len(nodes)),
+                        key=lambda index: int(quotas[index]) - quotas[index])
+    for index in remainders[:count - sum(shares)]:
+        shares[index] += 1
+    return shares
+
+
+def _sibling_order(cpus):
+    """
+    Orders given *cpus* so that hyper-threading siblings, which share their
+    caches, are next to each other.
+    """
+    def key(cpu):
+        path = os.path.join(CPU_FOLDER, 'cpu%d' % cpu, 'topology',
+                            'thread_siblings_list')
+        try:
+            with open(path) as file:
+                return (min(parse_cpulist(file.read()) | {cpu}), cpu)
+        except (OSError, ValueError):
+            return (cpu, cpu)
+    return sorted(cpus, key=key)
+
+
+@contextmanager
+def bound(cpus):
+    """
+    Binds the calling thread to given *cpus* for the duration of the block,
+    so that processes started within the block inherit them. Other threads
+    of this process are not affected. Does nothing if *cpus* is empty or
+    `None`.
+    """
+    if not cpus:
+        yield
+        return
+    # with pid 0, the affinity calls apply to the calling thread only
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, cpus)
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, previous)
+
+
+def apply(pid, cpus):
+    """
+    Binds the process with given *pid*, all of its threads and all of its
+    descendants (i.e. the workers of a uwsgi master) to given *cpus*. Returns
+    the number of threads that were bound.
+    """
+    children = _children()
+    pending = [pid]
+    count = 0
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, ()))
+        for task in _tasks(current):
+            try:
+                os.sched_setaffinity(task, cpus)
+                count += 1
+            except ProcessLookupError:
+                pass
+    return count
+
+
+def _tasks(pid):
+    try:
+        return [int(task) for task in os.listdir('/proc/%d/task' % pid)]
+    except FileNotFoundError:
+        return []
+
+
+def _children():
+    """
+    Maps the pid of every process to the pids of its children.
+    """
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/%s/stat' % entry, 'rb') as file:
+                stat = file.read()
+        except OSError:
+            continue
+        # the command name may contain spaces and parentheses
+        ppid = int(stat[stat.rindex(b')') + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    return children
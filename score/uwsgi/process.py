@@ -25,16 +25,25 @@
 # Licensee has his registered seat, an establishment or assets.
 
 
+from .collector import collect_stats, gather
 from .iniparser import UwsgiIni
+from . import placement
+from .projection import compile_fields, project
+from .tuning import Tuning
 
+from collections import OrderedDict
+from contextlib import contextmanager
+import errno
 import json
 import logging
 import os
-import re
 import socket
+import stat
 from subprocess import Popen, PIPE, DEVNULL
 import sys
 import textwrap
+import threading
+import time
 
 log = logging.getLogger(__name__)
 
@@ -69,13 +78,85 @@ class NotRunning(Exception):
     """
 
 
+class Timeout(Exception):
+    """
+    Indicates that an operation did not complete within its deadline.
+    """
+
+
+class StatsTimeout(Timeout):
+    """
+    Thrown when an instance did not deliver its statistics in time. Unlike
+    :class:`.NotRunning`, this means that the process exists, but is too busy
+    (or wedged) to answer.
+    """
+
+
+class InsufficientCapacity(Exception):
+    """
+    Thrown when an operation would reduce the number of workers available for
+    serving requests below the requested minimum.
+    """
+
+
+class StatsTooLarge(Exception):
+    """
+    Thrown when the statistics of an instance exceed the configured maximum
+    size.
+    """
+
+
 class UwsgiProcess:
     """
     A uwsgi process managed by this module.
+
+    Predicates like :meth:`.is_running` are answered from a snapshot of the
+    process' statistics (see :meth:`.snapshot`), which is re-used for
+    :attr:`.stats_ttl` seconds.
     """
 
+    #: Number of seconds a statistics snapshot remains valid.
+    stats_ttl = 1.0
+
+    #: The statistics fields contained in a snapshot, see the *fields*
+    #: parameter of :meth:`.read_stats`.
+    snapshot_fields = ('pid', 'workers[0].status')
+
+    #: Number of seconds to wait for the statistics socket to accept a
+    #: connection.
+    stats_connect_timeout = 1.0
+
+    #: Number of seconds to wait for the complete statistics payload.
+    stats_read_timeout = 5.0
+
+    #: Maximum size of the statistics payload in bytes.
+    stats_max_size = 16 * 1024 * 1024
+
+    #: Number of seconds to wait for a command sent through the master fifo
+    #: to take effect, if confirmation was requested (see
+    #: :meth:`.send_command`).
+    command_timeout = 10.0
+
+    #: A :class:`~score.uwsgi.history.History` recording every complete
+    #: read of :meth:`.read_stats`, or `None`.
+    history = None
+
+    #: Number of seconds to wait for in-flight requests to finish when
+    #: :meth:`draining <.Zergling.drain>` a zergling.
+    drain_timeout = 60.0
+
+    #: Whether processes are bound to their :attr:`.cpus` and zerglings are
+    #: placed on the CPUs of the host automatically (see
+    #: :meth:`.Overlord.rebalance`).
+    cpu_affinity = False
+
+    #: The CPUs this process is bound to, if :attr:`.cpu_affinity` is
+    #: enabled, or `None` to let it run on any CPU.
+    cpus = None
+
     def __init__(self):
         self._pid = None
+        self._snapshot = None
 
     def start(self, *, quiet=False, checkrunning=True):
         """
@@ -97,35 +178,112 @@ class UwsgiProcess:
         if quiet:
             stdout = DEVNULL
             stderr = PIPE
-        process = Popen(self.cmdline, stdout=stdout, stderr=stderr,
-                        cwd=os.path.join(self.folder, '..'))
+        # the daemonized master and all of its workers inherit the cpus
+        with placement.bound(self.cpus if self.cpu_affinity else None):
+            process = Popen(self.cmdline, stdout=stdout, stderr=stderr,
+                            cwd=os.path.join(self.folder, '..'))
         _, err = process.communicate()
         if process.returncode:
             msg = 'Error starting process %s' % self
             if err:
                 msg += ':\n' + textwrap.indent(str(err, 'UTF-8'), '  ')
             raise Exception(msg)
+        self.invalidate_snapshot()
 
-    def stop(self):
+    def stop(self, *, wait=False, timeout=None):
         """
         Stops this instance.
 
         Will raise :class:`.NotRunning`, if the instance was already stopped.
+        If *wait* is truthy, the function blocks until the process no longer
+        answers on its statistics socket (see :meth:`.send_command`).
         """
         if not self.is_running():
             raise NotRunning(str(self))
         log.info('Stopping %s' % str(self))
-        open(self.fifo, 'w').write('q')
+        confirm = None
+        if wait:
+            def confirm():
+                return not self.is_running()
+        self.send_command('q', confirm=confirm, timeout=timeout)
         self._pid = None
 
+    def send_command(self, commands, *, confirm=None, timeout=None):
+        """
+        Writes *commands*, a string of `master fifo`_ command characters, to
+        this process' fifo in a single write.
+
+        The fifo is opened without blocking, so a process that is not running
+        raises :class:`.NotRunning` immediately, even if it left a stale fifo
+        behind. The same applies if the path of the fifo is not a fifo at
+        all. A process, that does not empty its fifo, raises
+        :class:`.Timeout`.
+
+        If a *confirm* predicate is given, it is evaluated with a fresh
+        statistics snapshot until it returns a truthy value, but for at most
+        *timeout* seconds (defaulting to :attr:`.command_timeout`), after
+        which a :class:`.Timeout` is raised.
+
+        .. _master fifo:
+            http://uwsgi-docs.readthedocs.org/en/latest/MasterFIFO.html
+        """
+        try:
+            fd = os.open(self.fifo, os.O_WRONLY | os.O_NONBLOCK)
+        except FileNotFoundError:
+            raise NotRunning(str(self))
+        except OSError as e:
+            if e.errno != errno.ENXIO:
+                raise
+            # the fifo exists, but no process is reading it
+            raise NotRunning(str(self))
+        try:
+            if not stat.S_ISFIFO(os.fstat(fd).st_mode):
+                # a regular file left in place of the fifo
+                raise NotRunning(str(self))
+            os.write(fd, commands.encode('ASCII'))
+        except BlockingIOError:
+            raise Timeout('The fifo of %s is full' % self)
+        except BrokenPipeError:
+            raise NotRunning(str(self))
+        finally:
+            os.close(fd)
+        self.invalidate_snapshot()
+        if timeout is None:
+            timeout = self.command_timeout
+        if confirm is not None and not self._poll(confirm, timeout):
+            raise Timeout('%s did not confirm command %r within %ss' %
+                          (self, commands, timeout))
+
+    def _poll(self, predicate, timeout):
+        """
+        Evaluates *predicate* with fresh statistics snapshots until it returns
+        a truthy value and returns whether it did so within *timeout* seconds.
+        The interval between two evaluations starts at 10ms and backs off to
+        250ms.
+        """
+        deadline = time.monotonic() + timeout
+        delay = 0.01
+        while True:
+            self.invalidate_snapshot()
+            try:
+                if predicate():
+                    return True
+            except StatsTimeout:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.25)
+
     def is_running(self):
         """
         Whether this instance is running, i.e. the process exists and is
         responding to its requests on its statistics socket. See
-        :meth:`.read_stats`.
+        :meth:`.snapshot`.
         """
         try:
-            self.read_stats()
+            self.snapshot()
             return True
         except NotRunning:
             return False
@@ -136,30 +294,131 @@ class UwsgiProcess:
         The process id of this process, or `None` if it is not :meth:`.running`.
         """
         try:
-            return self.read_stats()['pid']
+            return self.snapshot()['pid']
         except NotRunning:
             return None
 
-    def read_stats(self):
+    def snapshot(self):
+        """
+        Provides the :attr:`.snapshot_fields` of this process' statistics, but
+        will only query the statistics socket if the last snapshot is older
+        than :attr:`.stats_ttl` seconds. A process that was found not to be
+        running (or not responding in time) is remembered just the same and
+        raises :class:`.NotRunning` (or :class:`.StatsTimeout`) until the
+        snapshot expires.
+        """
+        now = time.monotonic()
+        if self._snapshot is None or now - self._snapshot[0] > self.stats_ttl:
+            return self.refresh_snapshot()
+        _, stats, error = self._snapshot
+        if error is not None:
+            raise type(error)(*error.args)
+        return stats
+
+    def refresh_snapshot(self, timeout=None):
+        """
+        Unconditionally replaces the statistics snapshot with the
+        :attr:`.snapshot_fields` read from the statistics socket. If the
+        process is not running or did not respond in time, the snapshot will
+        remember the error and raise it.
+        """
+        try:
+            stats = self.read_stats(timeout=timeout,
+                                    fields=self.snapshot_fields)
+        except (NotRunning, StatsTimeout) as e:
+            self._snapshot = (time.monotonic(), None, e)
+            raise
+        self._snapshot = (time.monotonic(), stats, None)
+        return stats
+
+    def invalidate_snapshot(self):
+        """
+        Discards the current statistics snapshot, forcing the next call to
+        :meth:`.snapshot` to query the statistics socket. Called automatically
+        after every command sent to the process.
+        """
+        self._snapshot = None
+
+    def read_stats(self, timeout=None, fields=None):
         """
         Reads and parses all data from this process' `statistics socket`_.
 
+        It is possible to restrict the parsed data to a list of *fields*, which
+        are dotted paths into the statistics, where ``[*]`` addresses all
+        entries of a list and ``[N]`` its *N*-th entry. The result will only
+        contain the requested values, while everything else is skipped as
+        cheaply as possible::
+
+            >>> zergling.read_stats(fields=['pid', 'workers[*].status'])
+            {'pid': 1234, 'workers': [{'status': 'idle'}, {'status': 'busy'}]}
+
+        Fields without ``[*]`` (like ``pid`` or ``workers[0].status``) stop
+        decoding as soon as they were found, so their cost does not grow with
+        the number of workers. Fields with ``[*]`` are selected from the
+        complete statistics (see :mod:`.projection`).
+
+        Connecting to the socket and reading the payload are limited by
+        :attr:`.stats_connect_timeout` and :attr:`.stats_read_timeout`, unless
+        an explicit *timeout* is given, which is then used for both. Raises
+        :class:`.StatsTimeout` if either of these is exceeded and
+        :class:`.StatsTooLarge` if the payload is larger than
+        :attr:`.stats_max_size`.
+
+        Complete reads (without *fields*) are recorded in the process'
+        :attr:`.history`, if it has one.
+
         .. _statistics socket:
             http://uwsgi-docs.readthedocs.org/en/latest/StatsServer.html
         """
+        if timeout is None:
+            connect_timeout = self.stats_connect_timeout
+            read_timeout = self.stats_read_timeout
+        else:
+            connect_timeout = read_timeout = timeout
         try:
-            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-            sock.connect(self.stats_socket)
-            result = b''
-            read = sock.recv(4096)
-            while read:
-                result += read
-                read = sock.recv(4096)
-            return json.loads(str(result, 'UTF-8'))
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(connect_timeout)
+                sock.connect(self.stats_socket)
+                result = self._recv_all(sock, read_timeout)
+        except socket.timeout:
+            raise StatsTimeout(str(self))
         except (FileNotFoundError,
                 ConnectionRefusedError,
                 ConnectionResetError):
             raise NotRunning(str(self))
+        if fields is None:
+            stats = json.loads(str(result, 'UTF-8'))
+            if self.history is not None:
+                self.history.record(stats)
+            return stats
+        return project(str(result, 'UTF-8'), compile_fields(fields))
+
+    def _recv_all(self, sock, timeout):
+        """
+        Reads from *sock* until the peer closes the connection and returns the
+        received data as :class:`bytearray`. The buffer grows geometrically up
+        to :attr:`.stats_max_size`, while *timeout* limits the total duration.
+        """
+        deadline = time.monotonic() + timeout
+        limit = self.stats_max_size + 1
+        result = bytearray(min(65536, limit))
+        size = 0
+        while True:
+            if size == len(result):
+                if size >= limit:
+                    raise StatsTooLarge(str(self))
+                result.extend(bytes(min(size, limit - size)))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout()
+            sock.settimeout(remaining)
+            with memoryview(result) as view:
+                read = sock.recv_into(view[size:])
+            if not read:
+                break
+            size += read
+        del result[size:]
+        return result
 
 
 class Overlord(UwsgiProcess):
@@ -170,6 +429,10 @@ class Overlord(UwsgiProcess):
     def __init__(self, name):
         super().__init__()
         self.name = name
+        self._pool_lock = threading.Lock()
+        self._ini_lock = threading.RLock()
+        self._ini = None
+        self._zerglings = None
         self.folder = os.path.join(self.conf.rootdir, self.name)
         self.fifo = os.path.join(self.folder, 'overlord.fifo')
         self.logfile = os.path.join(self.folder, 'overlord.log')
@@ -182,60 +445,430 @@ class Overlord(UwsgiProcess):
         """
         Re-generates and writes this overlord's ini file.
         """
-        ini = UwsgiIni()
-        section = ini['overlord']
-        section['master'] = True
-        section['daemonize'] = self.logfile
-        section['pidfile'] = self.pidfile
-        section['stats-server'] = self.stats_socket
-        section['plugin'] = 'zergpool'
-        section['logdate'] = True
-        section['zerg-pool'] = '%s:%s' % (
-            os.path.join(self.folder, 'zerg.socket'),
-            os.path.join(self.folder, 'socket'))
-        section['master-fifo'] = self.fifo
-        os.makedirs(self.folder, exist_ok=True)
-        ini.write(open(self.inifile, 'w'))
+        with self.edit_ini() as ini:
+            ini.sections.clear()
+            section = ini['overlord']
+            section['master'] = True
+            section['daemonize'] = self.logfile
+            section['pidfile'] = self.pidfile
+            section['stats-server'] = self.stats_socket
+            section['plugin'] = 'zergpool'
+            section['logdate'] = True
+            section['zerg-pool'] = '%s:%s' % (
+                os.path.join(self.folder, 'zerg.socket'),
+                os.path.join(self.folder, 'socket'))
+            section['master-fifo'] = self.fifo
+
+    @contextmanager
+    def edit_ini(self):
+        """
+        A context manager providing this overlord's ini file for modification
+        as :class:`UwsgiIni` object. See :meth:`.UwsgiIni.transaction` for the
+        guarantees regarding locking and atomicity.
+
+        Blocks can be nested, in which case all nested blocks operate on the
+        same object and the file is written only once, when the outermost
+        block is left. This allows batching the configuration of many
+        zerglings::
+
+            with overlord.edit_ini():
+                for zergling in zerglings:
+                    zergling.regenini()
+            for zergling in zerglings:
+                zergling.start()
+
+        Note that processes must only be started after the outermost block
+        was left, since they would read an outdated ini file otherwise.
+
+        If :attr:`.cpu_affinity` is enabled, the zerglings are placed on the
+        CPUs of the host anew when the outermost block is left, and running
+        zerglings, whose CPUs changed, are bound to their new CPUs (see
+        :meth:`.rebalance`).
+        """
+        with self._ini_lock:
+            if self._ini is not None:
+                yield self._ini
+                return
+            os.makedirs(self.folder, exist_ok=True)
+            moved = []
+            try:
+                with UwsgiIni.transaction(self.inifile) as ini:
+                    self._ini = ini
+                    yield ini
+                    if self.cpu_affinity:
+                        moved = self._place(ini)
+            finally:
+                self._ini = None
+                self.invalidate_zerglings()
+            self._bind(moved)
+
+    def rebalance(self):
+        """
+        Partitions the CPUs of the host among all zerglings of this overlord
+        (see :func:`score.uwsgi.placement.partition`), stores the CPUs of each
+        zergling in its ini section and binds all running zerglings to their
+        CPUs. Returns the list of zerglings.
+
+        This happens automatically whenever zerglings are added or removed,
+        if :attr:`.cpu_affinity` is enabled. The placement is deterministic:
+        zerglings are ordered by name, so existing zerglings only move, if the
+        number of zerglings changes.
+        """
+        with self.edit_ini() as ini:
+            self._place(ini)
+        zerglings = sorted(self.zerglings(),
+                           key=lambda zergling: _placement_key(zergling.name))
+        self._bind(zerglings)
+        return zerglings
+
+    def _place(self, ini):
+        """
+        Updates the CPUs of all zergling sections in given *ini* and returns
+        the zerglings, whose CPUs changed.
+        """
+        names = [name[len('zergling-'):] for name in ini
+                 if name.startswith('zergling-')]
+        names.sort(key=_placement_key)
+        moved = []
+        for name, cpus in zip(names, placement.partition(len(names))):
+            section = ini['zergling-%s' % name]
+            value = placement.format_cpulist(cpus)
+            if section.get_all('score-cpus') != [value]:
+                section.reset('score-cpus', value)
+                moved.append(self.conf.Zergling._from_section(
+                    self, name, section))
+        return moved
+
+    def _bind(self, zerglings):
+        """
+        Binds all running *zerglings* including their workers to their CPUs.
+        """
+        zerglings = [zergling for zergling in zerglings if zergling.cpus]
+        results = collect_stats(zerglings, fields=('pid',))
+        for zergling, result in results.items():
+            if not result.ok:
+                continue
+            try:
+                placement.apply(result.value['pid'], zergling.cpus)
+            except OSError as e:
+                log.warning('Could not bind %s to cpus %s: %s' % (
+                    zergling, placement.format_cpulist(zergling.cpus), e))
 
     def zerglings(self):
         """
         All :class:`Zerglings <.Zergling>` associated with this overlord.
         """
-        zerglings = []
-        ini = UwsgiIni()
-        if os.path.exists(self.inifile):
-            ini.load(open(self.inifile))
-        for section_name in ini:
-            match = re.match(r'^zergling-(.*)$', section_name)
-            if not match:
-                continue
-            name = match.group(1)
-            section = ini[section_name]
-            zergling = self.conf.Zergling._from_section(self, name, section)
-            zerglings.append(zergling)
-        return zerglings
+        return list(self._zergling_index().values())
 
     def zergling(self, name):
+        """
+        The :class:`.Zergling` with given *name*. Raises
+        :class:`.NoSuchZergling` if there is none.
+        """
         try:
-            return next(z for z in self.zerglings() if z.name == name)
-        except StopIteration:
+            return self._zergling_index()[name]
+        except KeyError:
             raise NoSuchZergling(name)
 
+    def invalidate_zerglings(self):
+        """
+        Discards the cached list of zerglings, forcing the next call to
+        :meth:`.zerglings` to re-read the ini file. Called automatically
+        whenever this module writes the ini file.
+        """
+        self._zerglings = None
+
+    def _zergling_index(self):
+        """
+        Provides an :class:`collections.OrderedDict` mapping the names of all
+        zerglings to :class:`.Zergling` objects. The result is cached until
+        the inode, modification time or size of the ini file change.
+        """
+        try:
+            info = os.stat(self.inifile)
+            key = (info.st_ino, info.st_mtime_ns, info.st_size)
+        except FileNotFoundError:
+            key = None
+        if self._zerglings is not None and self._zerglings[0] == key:
+            return self._zerglings[1]
+        index = OrderedDict()
+        if key is not None:
+            ini = self._open_ini()
+            for section_name in ini:
+                if not section_name.startswith('zergling-'):
+                    continue
+                name = section_name[len('zergling-'):]
+                index[name] = self.conf.Zergling._from_section(
+                    self, name, ini[section_name])
+        self._zerglings = (key, index)
+        return index
+
+    def _open_ini(self):
+        """
+        Returns this overlord's ini file as :class:`UwsgiIni` object.
+        """
+        return UwsgiIni.load_path(self.inifile)
+
+    def new_zergling_name(self):
+        """
+        Provides a name for a new zergling, which is one more than the highest
+        numeric name of all existing zerglings.
+
+        Inside an :meth:`.edit_ini` block, the zerglings of the ini file being
+        edited are considered, so the name can be allocated and used within
+        the same transaction without racing other writers.
+        """
+        if self._ini is not None:
+            names = [name[len('zergling-'):] for name in self._ini
+                     if name.startswith('zergling-')]
+        else:
+            names = [zergling.name for zergling in self.zerglings()]
+        maxname = len(names)
+        for name in names:
+            try:
+                maxname = max(maxname, int(name))
+            except ValueError:
+                pass
+        return str(maxname + 1)
+
+    def standbys(self, appini):
+        """
+        All standby zerglings (see :meth:`.fill_pool`) serving given *appini*.
+        """
+        appini = os.path.abspath(appini)
+        return [z for z in self.zerglings()
+                if z.standby and os.path.abspath(z.appini) == appini]
+
+    def fill_pool(self, appini, size, *, virtualenv=None, tuning=None):
+        """
+        Spawns paused standby zerglings for given *appini* until there are
+        *size* of them. These zerglings have already loaded the application
+        and can start serving requests immediately when they are needed (see
+        :meth:`.scale_up`). New zerglings receive the given
+        :class:`~score.uwsgi.tuning.Tuning` profile.
+
+        Returns the list of newly spawned zerglings.
+        """
+        appini = os.path.abspath(appini)
+        spawned = []
+        with self._pool_lock:
+            missing = size - len(self.standbys(appini))
+            if missing <= 0:
+                return spawned
+            with self.edit_ini():
+                first = int(self.new_zergling_name())
+                for i in range(missing):
+                    zergling = self.conf.Zergling(self, str(first + i), appini)
+                    zergling.regenini(startpaused=True, virtualenv=virtualenv,
+                                      standby=True, tuning=tuning)
+                    spawned.append(zergling)
+            for zergling in spawned:
+                zergling.start(quiet=True)
+        return spawned
+
+    def scale_up(self, appini, *, pool_size=1, virtualenv=None, tuning=None,
+                 refill=True):
+        """
+        Adds capacity for given *appini* by resuming one of its standby
+        zerglings, which is then no longer considered a standby. If there is
+        no standby zergling ready, a new zergling is spawned instead, which
+        will need the usual time for loading the application.
+
+        Unless *refill* is falsy, the pool of standby zerglings is re-filled to
+        *pool_size* in a background thread afterwards. Spawned zerglings
+        receive the given :class:`~score.uwsgi.tuning.Tuning` profile.
+
+        Returns the zergling that was resumed or spawned.
+        """
+        # the refill thread must not depend on the current working directory
+        appini = os.path.abspath(appini)
+        zergling = None
+        for standby in self.standbys(appini):
+            try:
+                if not standby.is_paused():
+                    continue
+            except (NotRunning, StatsTimeout):
+                continue
+            standby.promote()
+            zergling = standby
+            break
+        if zergling is None:
+            # a refill thread might be allocating names at the same time
+            with self._pool_lock, self.edit_ini():
+                zergling = self.conf.Zergling(
+                    self, self.new_zergling_name(), appini)
+                zergling.regenini(virtualenv=virtualenv, tuning=tuning)
+            zergling.start(quiet=True)
+        if refill:
+            threading.Thread(
+                target=self.fill_pool, args=(appini, pool_size),
+                kwargs={'virtualenv': virtualenv, 'tuning': tuning}).start()
+        return zergling
+
+    def rolling_reload(self, *, max_parallel=1, min_available=0,
+                       timeout=None):
+        """
+        :meth:`Reloads <.Zergling.reload>` all running zerglings of this
+        overlord in batches of at most *max_parallel* zerglings, waiting for
+        each batch to complete before starting the next one.
+
+        A batch will never contain so many zerglings, that the number of
+        available workers of the remaining zerglings would drop below
+        *min_available*. The available workers are counted using the
+        zerglings' statistics, paused workers do not count. Raises
+        :class:`.InsufficientCapacity` if not even a single zergling can be
+        reloaded under this constraint.
+
+        The *timeout* is applied to each batch individually and defaults to
+        :attr:`.command_timeout`. The return value is an
+        :class:`collections.OrderedDict` mapping the names of the reloaded
+        zerglings to the duration of their batch in seconds. It is empty, if
+        no zergling is running. Zerglings, that stopped responding before
+        their turn, are skipped and mapped to `None`.
+        """
+        if timeout is None:
+            timeout = self.command_timeout
+        durations = OrderedDict()
+        pending = None
+        while pending is None or pending:
+            zerglings = self.zerglings()
+            capacity = OrderedDict()
+            results = collect_stats(
+                zerglings, fields=('pid', 'workers[*].status'))
+            for zergling, result in results.items():
+                if result.ok:
+                    capacity[zergling.name] = (
+                        zergling, _available_workers(result.value),
+                        result.value['pid'])
+            if pending is None:
+                pending = list(capacity)
+                if not pending:
+                    break
+            total = sum(workers for _, workers, _ in capacity.values())
+            batch = []
+            for name in pending:
+                if len(batch) >= max_parallel or name not in capacity:
+                    break
+                zergling, workers, _ = capacity[name]
+                if total - workers < min_available:
+                    break
+                total -= workers
+                batch.append(zergling)
+            if not batch:
+                if pending[0] not in capacity:
+                    name = pending.pop(0)
+                    log.warning('Skipping %s/zergling-%s, which is not '
+                                'responding' % (self, name))
+                    durations[name] = None
+                    continue
+                raise InsufficientCapacity(
+                    'Reloading %s/zergling-%s would leave less than %d '
+                    'available workers' % (self, pending[0], min_available))
+            started = time.monotonic()
+            old_pids = dict((zergling, capacity[zergling.name][2])
+                            for zergling in batch)
+            for zergling in batch:
+                zergling.reload()
+            results = gather(
+                lambda zergling: zergling.wait_reloaded(
+                    old_pids[zergling], timeout=timeout),
+                batch)
+            elapsed = time.monotonic() - started
+            for zergling, result in results.items():
+                if not result.ok:
+                    raise result.error
+                durations[zergling.name] = elapsed
+            del pending[:len(batch)]
+        return durations
+
+    def pause_all(self, zerglings=None, *, wait=False, timeout=None):
+        """
+        :meth:`Pauses <.Zergling.pause>` given *zerglings* of this overlord
+        (all of them by default) concurrently. Returns a mapping of each
+        zergling to its :class:`~score.uwsgi.collector.Result` as described
+        in :func:`~score.uwsgi.collector.gather`, the errors are not raised.
+        """
+        return self._command_all('pause', zerglings, wait=wait,
+                                 timeout=timeout)
+
+    def resume_all(self, zerglings=None, *, wait=False, timeout=None):
+        """
+        :meth:`Resumes <.Zergling.resume>` given *zerglings* concurrently, see
+        :meth:`.pause_all`.
+        """
+        return self._command_all('resume', zerglings, wait=wait,
+                                 timeout=timeout)
+
+    def drain_all(self, zerglings=None, *, timeout=None, force=False):
+        """
+        :meth:`Drains <.Zergling.drain>` given *zerglings* concurrently, see
+        :meth:`.pause_all`.
+        """
+        return self._command_all('drain', zerglings, timeout=timeout,
+                                 force=force)
+
+    def stop_all(self, zerglings=None, *, wait=False, timeout=None):
+        """
+        :meth:`Stops <.UwsgiProcess.stop>` given *zerglings* concurrently, see
+        :meth:`.pause_all`.
+        """
+        return self._command_all('stop', zerglings, wait=wait,
+                                 timeout=timeout)
+
+    def _command_all(self, method, zerglings, **kwargs):
+        if zerglings is None:
+            zerglings = self.zerglings()
+        return gather(
+            lambda zergling: getattr(zergling, method)(**kwargs), zerglings)
+
     def __str__(self):
         return self.name
 
 
+def _placement_key(name):
+    # numeric names in numeric order, followed by all others
+    try:
+        return (0, int(name), name)
+    except ValueError:
+        return (1, 0, name)
+
+
+def _available_workers(stats):
+    """
+    Counts the workers in given *stats* that are able to serve requests.
+    """
+    return sum(1 for worker in stats.get('workers', [])
+               if worker['status'] not in ('pause', 'cheap'))
+
+
 class Zergling(UwsgiProcess):
+    """
+    A process serving an application through its :class:`.Overlord`.
+
+    Additional information about a zergling, like whether it is a *standby*
+    zergling (see :meth:`.Overlord.fill_pool`), is stored in its ini section
+    with keys starting with ``score-``, which uwsgi treats as placeholders.
+    Its :class:`~score.uwsgi.tuning.Tuning` profile is stored as regular uwsgi
+    options.
+    """
 
     @classmethod
     def _from_section(cls, overlord, name, section):
-        return cls(overlord, name, section['ini-paste'])
+        cpus = section.get_all('score-cpus')
+        return cls(overlord, name, section['ini-paste'],
+                   standby=bool(section.get_all('score-standby')),
+                   tuning=Tuning.from_section(section),
+                   cpus=placement.parse_cpulist(cpus[-1]) if cpus else None)
 
-    def __init__(self, overlord, name, appini):
+    def __init__(self, overlord, name, appini, *, standby=False,
+                 tuning=None, cpus=None):
         super().__init__()
         self.overlord = overlord
         self.name = name
         self.appini = appini
+        self.standby = standby
+        self.tuning = tuning if tuning is not None else Tuning()
+        self.cpus = cpus
         self.folder = self.overlord.folder
         self.fifo = os.path.join(self.folder, 'zergling-%s.fifo' % name)
         self.logfile = os.path.join(self.folder, 'zergling-%s.log' % name)
@@ -249,95 +882,202 @@ class Zergling(UwsgiProcess):
             "uwsgi", "--ini",
             "%s/uwsgi.ini:zergling-%s" % (self.overlord.name, self.name)]
 
-    def regenini(self, startpaused=False, virtualenv=None):
+    def regenini(self, startpaused=False, virtualenv=None, standby=None,
+                 tuning=None):
         """
         Re-generates and updates this zerglings section in the overlord's ini
         file.  It is possible to create the configuration in a way that pauses
         the process immediately upon starting by passign a truthy value for
         *startpaused*.
+
+        The *standby* flag and the *tuning* profile are stored in the section,
+        too. They keep their current values if they are not given. The
+        profile's options follow the application's ini file, so they take
+        precedence over the settings found there.
         """
-        ini = self._open_ini()
-        if 'zergling-%s' % self.name in ini:
-            del ini['zergling-%s' % self.name]
-        section = ini['zergling-%s' % self.name]
-        if virtualenv:
-            section['virtualenv'] = virtualenv
-        section['zerg'] = os.path.join(self.folder, 'zerg.socket')
-        section['daemonize'] = self.logfile
-        section['pidfile'] = self.pidfile
-        section['logdate'] = True
-        section['stats-server'] = self.stats_socket
-        section['master-fifo'] = self.fifo
-        section['master-fifo'] = self.fifo + '.restart'
-        if startpaused:
-            section['plugin'] = "startpaused"
-        section['plugin'] = "python%s" % ''.join(map(str, sys.version_info[:2]))
-        section['ini-paste'] = self.appini
-        section['hook-asap'] = 'write:%s true' % self.startup_file
-        section['hook-accepting1-once'] = 'unlink:%s' % self.startup_file
-        section['hook-as-user-atexit'] = 'unlink:%s.restart' % self.fifo
-        section['hook-as-user-atexit'] = 'unlink:%s' % self.startup_file
-        os.makedirs(self.folder, exist_ok=True)
-        ini.write(open(self.inifile, 'w'))
+        if standby is not None:
+            self.standby = standby
+        if tuning is not None:
+            self.tuning = tuning
+        with self.overlord.edit_ini() as ini:
+            if 'zergling-%s' % self.name in ini:
+                del ini['zergling-%s' % self.name]
+            section = ini['zergling-%s' % self.name]
+            if virtualenv:
+                section['virtualenv'] = virtualenv
+            section['zerg'] = os.path.join(self.folder, 'zerg.socket')
+            section['daemonize'] = self.logfile
+            section['pidfile'] = self.pidfile
+            section['logdate'] = True
+            section['stats-server'] = self.stats_socket
+            section['master-fifo'] = self.fifo
+            section['master-fifo'] = self.fifo + '.restart'
+            if startpaused:
+                section['plugin'] = "startpaused"
+            section['plugin'] = "python%s" % ''.join(
+                map(str, sys.version_info[:2]))
+            section['ini-paste'] = self.appini
+            self.tuning.write(section)
+            section['hook-asap'] = 'write:%s true' % self.startup_file
+            section['hook-accepting1-once'] = 'unlink:%s' % self.startup_file
+            section['hook-as-user-atexit'] = 'unlink:%s.restart' % self.fifo
+            section['hook-as-user-atexit'] = 'unlink:%s' % self.startup_file
+            if self.standby:
+                section['score-standby'] = True
+            if self.cpus:
+                section['score-cpus'] = placement.format_cpulist(self.cpus)
 
-    def reload(self, quiet=True):
+    def promote(self):
+        """
+        Resumes this paused standby zergling and turns it into a regular one.
+        """
+        self.resume()
+        with self.overlord.edit_ini() as ini:
+            ini['zergling-%s' % self.name].reset('score-standby')
+        self.standby = False
+
+    def reload(self, quiet=True, *, wait=False, timeout=None):
         """
         Starts another instance of this process, which will stop the old
         instance once it is up and running. This means that there will be twice
         the number of processes for a short time and it will not be clear which
         of these instances will respond to an incoming request for a very brief
         time frame.
+
+        If *wait* is truthy, the function will block until the handover is
+        complete (see :meth:`.wait_reloaded`) and return its duration in
+        seconds.
         """
         if self.is_reloading():
             raise AlreadyReloading(str(self))
         log.info('Reloading %s' % str(self))
-        open(self.fifo, 'w').write('1')
+        started = time.monotonic()
+        old_pid = self.pid
+        self.send_command('1')
         try:
             startpaused = self.is_paused()
         except NotRunning:
             startpaused = False
-        ini = self._open_ini()
-        section = ini['zergling-%s' % self.name]
-        plugins = []
-        found = False
-        for plugin in section.get_all('plugin'):
-            if plugin == "startpaused":
-                found = True
-                if startpaused:
-                    break
-            else:
-                plugins.append(plugin)
-        if found and not startpaused:
-            section.reset("plugin")
-            for plugin in plugins:
-                section["plugin"] = plugin
-        elif not found and startpaused:
-            section["plugin"] = "startpaused"
-        hooks = ("writefifo:%s.restart q" % self.fifo,)
-        for hook in hooks:
-            if hook not in section.get_all('hook-accepting1-once'):
-                section['hook-accepting1-once'] = hook
-        ini.write(open(self.inifile, 'w'))
+        with self.overlord.edit_ini() as ini:
+            section = ini['zergling-%s' % self.name]
+            plugins = []
+            found = False
+            for plugin in section.get_all('plugin'):
+                if plugin == "startpaused":
+                    found = True
+                    if startpaused:
+                        break
+                else:
+                    plugins.append(plugin)
+            if found and not startpaused:
+                section.reset("plugin")
+                for plugin in plugins:
+                    section["plugin"] = plugin
+            elif not found and startpaused:
+                section["plugin"] = "startpaused"
+            hooks = ("writefifo:%s.restart q" % self.fifo,)
+            for hook in hooks:
+                if hook not in section.get_all('hook-accepting1-once'):
+                    section['hook-accepting1-once'] = hook
         self.start(quiet=quiet, checkrunning=False)
+        if wait:
+            self.wait_reloaded(old_pid, timeout=timeout)
+            return time.monotonic() - started
+
+    def wait_reloaded(self, old_pid, timeout=None):
+        """
+        Blocks until a :meth:`.reload` is complete, i.e. the new instance has
+        started accepting requests and the old instance, which was running
+        with given *old_pid*, has exited. Raises :class:`.Timeout` if that did
+        not happen within *timeout* seconds.
+
+        The zergling's folder is watched for changes, so this function returns
+        as soon as the handover is done.
+        """
+        def reloaded():
+            if self.is_starting() or self.is_reloading():
+                return False
+            self.invalidate_snapshot()
+            try:
+                return self.pid not in (None, old_pid)
+            except StatsTimeout:
+                return False
+        from .inotify import wait_until  # loads ctypes
+        if not wait_until(self.folder, reloaded, timeout):
+            raise Timeout('%s did not finish reloading within %ss' %
+                          (self, timeout))
 
-    def pause(self):
+    def pause(self, *, wait=False, timeout=None):
         """
         Pauses this instance. Raises :class:`.AlreadyPaused` if already paused.
+        If *wait* is truthy, the function blocks until the workers report
+        being paused (see :meth:`.send_command`).
         """
         if self.is_paused():
             raise AlreadyPaused(str(self))
         log.info('Pausing %s' % str(self))
-        open(self.fifo, 'w').write('p')
+        confirm = self.is_paused if wait else None
+        self.send_command('p', confirm=confirm, timeout=timeout)
 
-    def resume(self):
+    def resume(self, *, wait=False, timeout=None):
         """
         Resumes this instance. Raises :class:`.AlreadyRunning` if already
-        running.
+        running. If *wait* is truthy, the function blocks until the workers
+        no longer report being paused (see :meth:`.send_command`).
         """
         if not self.is_paused():
             raise AlreadyRunning(str(self))
         log.info('Resuming %s' % str(self))
-        open(self.fifo, 'w').write('p')
+        confirm = None
+        if wait:
+            def confirm():
+                return not self.is_paused()
+        self.send_command('p', confirm=confirm, timeout=timeout)
+
+    def drain(self, *, timeout=None, force=False):
+        """
+        Stops this instance without interrupting the requests it is handling.
+
+        The zergling is :meth:`paused <.pause>` first, so the zerg pool stops
+        passing connections to it. Its workers are then watched until none
+        of them is busy and their request counters did not change between
+        two consecutive polls. Only then is the zergling stopped.
+
+        If the workers are not idle within *timeout* seconds (defaulting to
+        :attr:`.drain_timeout`), a :class:`.Timeout` is raised and the
+        zergling remains paused, unless *force* is truthy, in which case it
+        is stopped anyway. Returns the duration of the drain in seconds.
+        """
+        if timeout is None:
+            timeout = self.drain_timeout
+        started = time.monotonic()
+        log.info('Draining %s' % str(self))
+        if not self.is_paused():
+            self.pause(wait=True, timeout=timeout)
+        previous = None
+
+        def idle():
+            nonlocal previous
+            stats = self.read_stats(
+                fields=('workers[*].status', 'workers[*].requests'))
+            workers = stats.get('workers', [])
+            if any(worker['status'] == 'busy' or
+                   worker['status'].startswith('sig') for worker in workers):
+                previous = None
+                return False
+            requests = [worker['requests'] for worker in workers]
+            done = requests == previous
+            previous = requests
+            return done
+
+        remaining = max(0, timeout - (time.monotonic() - started))
+        if not self._poll(idle, remaining):
+            if not force:
+                raise Timeout('%s did not finish its requests within %ss' %
+                              (self, timeout))
+            log.warning('Stopping %s with requests in flight' % str(self))
+        self.stop()
+        return time.monotonic() - started
 
     def start(self, *args, **kwargs):
         """
@@ -346,6 +1086,12 @@ class Zergling(UwsgiProcess):
         """
         if self.is_starting():
             raise AlreadyRunning(str(self))
+        if self.cpu_affinity:
+            # the placement may have changed since this object was created
+            try:
+                self.cpus = self.overlord.zergling(self.name).cpus
+            except NoSuchZergling:
+                pass
         super().start(*args, **kwargs)
 
     def delete(self):
@@ -354,11 +1100,10 @@ class Zergling(UwsgiProcess):
         """
         if not os.path.exists(self.inifile):
             return
-        ini = self._open_ini()
-        if 'zergling-%s' % self.name not in ini:
-            return
-        del ini['zergling-%s' % self.name]
-        ini.write(open(self.inifile, 'w'))
+        with self.overlord.edit_ini() as ini:
+            if 'zergling-%s' % self.name not in ini:
+                return
+            del ini['zergling-%s' % self.name]
         files = (self.stats_socket, self.startup_file,
                  self.fifo, self.fifo + '.restart')
         for file in files:
@@ -386,16 +1131,7 @@ class Zergling(UwsgiProcess):
         """
         Whether the instance is currently paused.
         """
-        return self.read_stats()['workers'][0]['status'] == 'pause'
-
-    def _open_ini(self):
-        """
-        Returns the overlords ini file as :class:`UwsgiIni` object.
-        """
-        ini = UwsgiIni()
-        if os.path.exists(self.inifile):
-            ini.load(open(self.inifile))
-        return ini
+        return self.snapshot()['workers'][0]['status'] == 'pause'
 
     def __str__(self):
         return '%s/zergling-%s' % (self.overlord.name, self.name)
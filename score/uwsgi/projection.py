@@ -0,0 +1,207 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+Partial decoding of JSON documents. Only the values at requested *fields* are
+returned.
+
+A field is a dotted path into the document, where ``[*]`` selects all entries
+of an array and ``[N]`` selects its *N*-th entry::
+
+    >>> project('{"pid": 12, "workers": [{"id": 1, "status": "idle"}]}',
+    ...         compile_fields(['pid', 'workers[*].status']))
+    {'pid': 12, 'workers': [{'status': 'idle'}]}
+
+Fields without ``[*]`` are extracted by scanning the document, which stops as
+soon as all of them were found, so their cost does not depend on the size of
+the remaining document. Fields with ``[*]`` need all entries of an array
+anyway and are selected from the fully decoded document instead: skipping the
+rest of every entry in python costs more than letting the C decoder build it.
+"""
+
+import json
+import re
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_STRING_BODY = r'[^"\\]*(?:\\.[^"\\]*)*'
+_KEY = re.compile(r'"(%s)"[ \t\n\r]*:[ \t\n\r]*' % _STRING_BODY, re.DOTALL)
+_STRING = re.compile(r'"%s"' % _STRING_BODY, re.DOTALL)
+_SCALAR = re.compile(r'[^,\]}\s]*')
+_FIELD_PART = re.compile(r'^([^\[\]]+)((?:\[(?:\*|\d+)\])*)$')
+_INDEX = re.compile(r'\[(\*|\d+)\]')
+
+_decoder = json.JSONDecoder()
+
+
+def compile_fields(fields):
+    """
+    Converts a list of field paths into the tree structure expected by
+    :func:`.project`. A tree is a `dict` mapping keys (or ``'*'`` and
+    integers for array entries) to sub-trees, where `None` stands for the
+    complete value.
+    """
+    tree = {}
+    for field in fields:
+        path = []
+        for part in field.split('.'):
+            match = _FIELD_PART.match(part)
+            if not match:
+                raise ValueError('Invalid field: %s' % field)
+            path.append(match.group(1))
+            for index in _INDEX.findall(match.group(2)):
+                path.append(index if index == '*' else int(index))
+        node = tree
+        for key in path[:-1]:
+            if key in node and node[key] is None:
+                break
+            node = node.setdefault(key, {})
+        else:
+            node[path[-1]] = None
+    return tree
+
+
+def project(string, tree):
+    """
+    Decodes the parts of the JSON document *string* described by *tree* (see
+    :func:`.compile_fields`). The result has the same structure as the
+    document, but only contains the requested values. Selected entries of an
+    array are returned as a list in the order of their indexes.
+    """
+    if _has_wildcard(tree):
+        return select(json.loads(string), tree)
+    idx = _WHITESPACE.match(string, 0).end()
+    return _value(string, idx, tree, True)[0]
+
+
+def select(value, tree):
+    """
+    Applies the *tree* (see :func:`.compile_fields`) to an already decoded
+    *value*.
+    """
+    if tree is None:
+        return value
+    if isinstance(value, dict):
+        return dict((key, select(value[key], subtree))
+                    for key, subtree in tree.items() if key in value)
+    if isinstance(value, list):
+        if '*' in tree:
+            return [select(entry, tree['*']) for entry in value]
+        return [select(value[index], tree[index]) for index in sorted(tree)
+                if index < len(value)]
+    return None
+
+
+def _has_wildcard(tree):
+    if tree is None:
+        return False
+    return any(key == '*' or _has_wildcard(subtree)
+               for key, subtree in tree.items())
+
+
+# The scanning functions return the decoded value and the position after it.
+# The position is None if *last* was truthy, i.e. nothing after this value is
+# needed, which ends the scan of the whole document.
+
+def _value(string, idx, tree, last):
+    if tree is None:
+        value, idx = _decoder.raw_decode(string, idx)
+        return value, None if last else idx
+    char = string[idx]
+    if char == '{':
+        return _object(string, idx, tree, last)
+    if char == '[':
+        return _array(string, idx, tree, last)
+    return None, None if last else _skip(string, idx)
+
+
+def _object(string, idx, tree, last):
+    result = {}
+    idx = _WHITESPACE.match(string, idx + 1).end()
+    if string[idx] == '}':
+        return result, None if last else idx + 1
+    while True:
+        match = _KEY.match(string, idx)
+        if not match:
+            raise ValueError('Expected key at position %d' % idx)
+        key = match.group(1)
+        if '\\' in key:
+            key = json.loads('"%s"' % key)
+        idx = match.end()
+        if key in tree:
+            final = last and len(result) + 1 == len(tree)
+            result[key], idx = _value(string, idx, tree[key], final)
+            if idx is None:
+                return result, None
+        else:
+            idx = _skip(string, idx)
+        idx = _WHITESPACE.match(string, idx).end()
+        char = string[idx]
+        if char == '}':
+            return result, None if last else idx + 1
+        if char != ',':
+            raise ValueError('Expected "," or "}" at position %d' % idx)
+        idx = _WHITESPACE.match(string, idx + 1).end()
+
+
+def _array(string, idx, tree, last):
+    result = []
+    highest = max(tree)
+    index = 0
+    idx = _WHITESPACE.match(string, idx + 1).end()
+    if string[idx] == ']':
+        return result, None if last else idx + 1
+    while True:
+        if index in tree:
+            value, idx = _value(string, idx, tree[index],
+                                last and index == highest)
+            result.append(value)
+            if idx is None:
+                return result, None
+        else:
+            idx = _skip(string, idx)
+        index += 1
+        idx = _WHITESPACE.match(string, idx).end()
+        char = string[idx]
+        if char == ']':
+            return result, None if last else idx + 1
+        if char != ',':
+            raise ValueError('Expected "," or "]" at position %d' % idx)
+        idx = _WHITESPACE.match(string, idx + 1).end()
+
+
+def _skip(string, idx):
+    """
+    Returns the position right after the JSON value starting at *idx*.
+    Containers are passed to the C decoder, which is faster than scanning for
+    the matching bracket in python.
+    """
+    char = string[idx]
+    if char == '"':
+        return _STRING.match(string, idx).end()
+    if char not in '[{':
+        return _SCALAR.match(string, idx).end()
+    return _decoder.raw_decode(string, idx)[1]
@@ -0,0 +1,375 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+A shared, memory-mapped store of the latest statistics of all processes
+below a rootdir. A single :class:`.Publisher` reads the statistics sockets
+and writes the results into a file with a fixed layout, which any number of
+:class:`StatsReaders <.StatsReader>` can read without connecting to a
+single socket.
+
+The file consists of a header followed by a fixed number of slots, one per
+process. Writes are guarded by a sequence counter (a seqlock): the writer
+makes the counter odd before changing anything and even again afterwards, so
+a reader knows that it got a consistent snapshot if the counter was even and
+unchanged before and after reading.
+
+If the number of processes outgrows the file, the publisher replaces it
+with a larger one and marks the old file as retired, which makes readers
+re-open the path.
+"""
+
+from collections import OrderedDict, namedtuple
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from .collector import collect_stats
+
+log = logging.getLogger(__name__)
+
+#: Name of the file below the rootdir.
+FILENAME = '.stats.mmap'
+
+MAGIC = b'SCUW'
+VERSION = 1
+
+#: The statistics fields read by the :class:`.Publisher`.
+FIELDS = (
+    'pid', 'listen_queue', 'workers[*].status', 'workers[*].requests',
+    'workers[*].exceptions', 'workers[*].avg_rt', 'workers[*].rss',
+)
+
+#: The statistics of a single process, as stored in a slot. The *name* is
+#: the overlord's name for overlords and ``overlord/zergling`` for zerglings.
+#: *requests*, *exceptions* and *rss* are summed over all workers, *avg_rt*
+#: is the mean response time in microseconds weighted by the workers'
+#: requests and *time* is the unix timestamp of the measurement.
+Entry = namedtuple('Entry', (
+    'name', 'up', 'pid', 'listen_queue', 'workers', 'busy', 'paused',
+    'requests', 'exceptions', 'avg_rt', 'rss', 'time'))
+
+# magic, version, capacity, retired
+_HEADER = struct.Struct('<4sIII')
+_SEQUENCE = struct.Struct('<Q')
+_SEQUENCE_OFFSET = _HEADER.size
+# time of the last update, number of used slots
+_META = struct.Struct('<dI')
+_META_OFFSET = _SEQUENCE_OFFSET + _SEQUENCE.size
+_HEADER_SIZE = 64
+
+_SLOT = struct.Struct('<64s?3xIIIIIQQdQd')
+_NAME_SIZE = 64
+
+
+def path(rootdir):
+    """
+    Returns the path of the shared statistics file of given *rootdir*.
+    """
+    return os.path.join(rootdir, FILENAME)
+
+
+class StatsWriter:
+    """
+    Writes :class:`Entries <.Entry>` to the shared statistics file at
+    *path*, which is created (or replaced) if it cannot hold at least
+    *capacity* processes. Only one writer may exist per file, a second one
+    raises :class:`BlockingIOError`.
+    """
+
+    def __init__(self, path, capacity=1024):
+        self.path = path
+        self._lock = open(path + '.lock', 'a')
+        try:
+            fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock.close()
+            raise
+        self._file = None
+        self._map = None
+        self.capacity = 0
+        self._open(capacity)
+
+    def _open(self, capacity):
+        try:
+            file = open(self.path, 'r+b')
+        except FileNotFoundError:
+            file = None
+        if file is None:
+            self._create(capacity)
+            return
+        header = file.read(_HEADER.size)
+        ours = False
+        if len(header) == _HEADER.size:
+            magic, version, existing, retired = _HEADER.unpack(header)
+            ours = (magic, version) == (MAGIC, VERSION)
+            if ours and not retired and existing >= capacity:
+                self._attach(file, existing)
+                return
+        with file:
+            self._create(capacity)
+            if ours:
+                # readers of the replaced file will re-open the path
+                file.seek(0)
+                file.write(_HEADER.pack(MAGIC, VERSION, existing, 1))
+
+    def _create(self, capacity):
+        size = _HEADER_SIZE + capacity * _SLOT.size
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path),
+                                   prefix=FILENAME + '.')
+        try:
+            os.ftruncate(fd, size)
+            os.write(fd, _HEADER.pack(MAGIC, VERSION, capacity, 0))
+            os.fchmod(fd, 0o644)
+        except Exception:
+            os.close(fd)
+            os.remove(tmp)
+            raise
+        file = os.fdopen(fd, 'r+b')
+        os.replace(tmp, self.path)
+        old, old_file, old_capacity = self._map, self._file, self.capacity
+        self._map = self._file = None
+        self._attach(file, capacity)
+        if old is not None:
+            # readers of the replaced file will re-open the path
+            _HEADER.pack_into(old, 0, MAGIC, VERSION, old_capacity, 1)
+            old.close()
+            old_file.close()
+
+    def _attach(self, file, capacity):
+        if self._file is not None:
+            self._file.close()
+        self._file = file
+        self._map = mmap.mmap(file.fileno(), 0)
+        self.capacity = capacity
+
+    def write(self, entries):
+        """
+        Replaces the contents of the file with given *entries* atomically
+        for all readers.
+        """
+        entries = list(entries)
+        if len(entries) > self.capacity:
+            self._create(max(len(entries), self.capacity * 2))
+        view = self._map
+        sequence = _SEQUENCE.unpack_from(view, _SEQUENCE_OFFSET)[0]
+        if sequence % 2:
+            # a previous writer died halfway
+            sequence += 1
+        _SEQUENCE.pack_into(view, _SEQUENCE_OFFSET, sequence + 1)
+        offset = _HEADER_SIZE
+        for entry in entries:
+            _SLOT.pack_into(view, offset, _encode_name(entry.name),
+                            *entry[1:])
+            offset += _SLOT.size
+        _META.pack_into(view, _META_OFFSET, time.time(), len(entries))
+        _SEQUENCE.pack_into(view, _SEQUENCE_OFFSET, sequence + 2)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+        fcntl.flock(self._lock, fcntl.LOCK_UN)
+        self._lock.close()
+
+
+class StatsReader:
+    """
+    Reads consistent snapshots from the shared statistics file at *path*.
+    The statistics are parsed directly from the memory map, nothing is
+    copied beforehand.
+    """
+
+    #: Number of attempts to get a consistent snapshot, before giving up.
+    retries = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._map = None
+
+    def _open(self):
+        self.close()
+        file = open(self.path, 'rb')
+        try:
+            view = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file, the writer has not finished creating it
+            file.close()
+            raise FileNotFoundError(self.path)
+        magic, version, _, _ = _HEADER.unpack_from(view, 0)
+        if (magic, version) != (MAGIC, VERSION):
+            view.close()
+            file.close()
+            raise ValueError('Unsupported statistics file %s' % self.path)
+        self._file, self._map = file, view
+
+    def snapshot(self):
+        """
+        Returns the time of the last update and an
+        :class:`collections.OrderedDict` mapping process names to their
+        :class:`.Entry`. Raises :class:`FileNotFoundError` if no
+        :class:`.Publisher` has written the file yet.
+        """
+        for _ in range(self.retries):
+            if self._map is None or _HEADER.unpack_from(self._map, 0)[3]:
+                self._open()
+            view = self._map
+            before = _SEQUENCE.unpack_from(view, _SEQUENCE_OFFSET)[0]
+            if before % 2:
+                time.sleep(0)
+                continue
+            updated, count = _META.unpack_from(view, _META_OFFSET)
+            entries = []
+            if count <= _HEADER.unpack_from(view, 0)[2]:
+                entries = [_SLOT.unpack_from(view, offset) for offset in
+                           range(_HEADER_SIZE,
+                                 _HEADER_SIZE + count * _SLOT.size,
+                                 _SLOT.size)]
+            after = _SEQUENCE.unpack_from(view, _SEQUENCE_OFFSET)[0]
+            if before != after:
+                continue
+            result = OrderedDict()
+            for values in entries:
+                name = values[0].rstrip(b'\0').decode('UTF-8')
+                result[name] = Entry(name, *values[1:])
+            return updated, result
+        raise BlockingIOError('No consistent snapshot of %s' % self.path)
+
+    def get(self, name):
+        """
+        Returns the :class:`.Entry` of the process with given *name* (see
+        :class:`.Entry`), or `None` if it is not in the file.
+        """
+        return self.snapshot()[1].get(name)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Publisher:
+    """
+    Polls all overlords and zerglings of a :class:`ConfiguredUwsgiModule
+    <score.uwsgi.ConfiguredUwsgiModule>` every *interval* seconds and
+    publishes their statistics in the shared statistics file of its rootdir.
+    """
+
+    def __init__(self, conf, *, interval=1.0, timeout=None, capacity=1024):
+        self.conf = conf
+        self.interval = interval
+        self.timeout = timeout
+        self.capacity = capacity
+        self._writer = None
+        self._stop = threading.Event()
+
+    def poll(self):
+        """
+        Reads the statistics of all processes and writes them to the file.
+        """
+        if self._writer is None:
+            self._writer = StatsWriter(path(self.conf.rootdir), self.capacity)
+        now = time.time()
+        entries = []
+        results = self.conf.collect_stats(timeout=self.timeout, fields=FIELDS)
+        for process, result in results.items():
+            if hasattr(process, 'overlord'):
+                name = '%s/%s' % (process.overlord.name, process.name)
+            else:
+                name = process.name
+            if len(name.encode('UTF-8')) > _NAME_SIZE:
+                log.warning('Not publishing %s: name too long' % name)
+                continue
+            entries.append(_entry(name, result, now))
+        self._writer.write(entries)
+
+    def run(self):
+        """
+        Calls :meth:`.poll` every :attr:`.interval` seconds until
+        :meth:`.stop` is called.
+        """
+        log.info('Publishing statistics to %s' % path(self.conf.rootdir))
+        try:
+            while not self._stop.is_set():
+                start = time.monotonic()
+                try:
+                    self.poll()
+                except BlockingIOError:
+                    # another publisher owns the file
+                    raise
+                except Exception:
+                    log.exception('Error polling statistics')
+                elapsed = time.monotonic() - start
+                self._stop.wait(max(0, self.interval - elapsed))
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def stop(self):
+        """
+        Makes :meth:`.run` return after the current poll.
+        """
+        self._stop.set()
+
+
+def _entry(name, result, now):
+    if not result.ok:
+        return Entry(name, False, 0, 0, 0, 0, 0, 0, 0, 0.0, 0, now)
+    stats = result.value
+    workers = stats.get('workers', [])
+    requests = sum(worker['requests'] for worker in workers)
+    weighted_rt = sum(worker['avg_rt'] * worker['requests']
+                      for worker in workers)
+    return Entry(
+        name, True, stats.get('pid', 0), stats.get('listen_queue', 0),
+        len(workers),
+        sum(1 for worker in workers if worker['status'] == 'busy'),
+        sum(1 for worker in workers if worker['status'] == 'pause'),
+        requests,
+        sum(worker['exceptions'] for worker in workers),
+        weighted_rt / requests if requests else 0.0,
+        sum(worker['rss'] for worker in workers),
+        now)
+
+
+def _encode_name(name):
+    return name.encode('UTF-8')[:_NAME_SIZE]
@@ -0,0 +1,208 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+Capacity settings of zerglings. A :class:`.Tuning` profile is written into a
+zergling's section of the overlord's ini file as regular uwsgi options, so
+the settings are managed per zergling instead of being hand-edited into the
+application's ini file::
+
+    tuning = Tuning(processes=4, threads=2, harakiri=30, thunder_lock=True)
+    zergling.regenini(tuning=tuning)
+"""
+
+#: Attribute name, uwsgi option and type of all scalar settings.
+OPTIONS = (
+    ('processes', 'processes', int),
+    ('threads', 'threads', int),
+    ('buffer_size', 'buffer-size', int),
+    ('listen', 'listen', int),
+    ('harakiri', 'harakiri', int),
+    ('max_requests', 'max-requests', int),
+    ('cheaper', 'cheaper', int),
+    ('cheaper_algo', 'cheaper-algo', str),
+    ('cheaper_initial', 'cheaper-initial', int),
+    ('cheaper_step', 'cheaper-step', int),
+    ('thunder_lock', 'thunder-lock', bool),
+)
+
+#: The supported loop engines, see :attr:`.Tuning.loop`.
+LOOP_ENGINES = ('gevent', 'asyncio')
+
+#: The supported algorithms for spawning workers on demand.
+CHEAPER_ALGORITHMS = ('spare', 'spare2', 'backlog', 'busyness')
+
+
+class Tuning:
+    """
+    An immutable set of capacity settings for a zergling. Settings that were
+    not given (i.e. are `None`) are not written, leaving the decision to the
+    application's ini file or uwsgi's defaults.
+
+    :attr:`processes`, :attr:`threads`
+        The number of worker processes and the number of threads per worker.
+
+    :attr:`loop`, :attr:`async_cores`
+        An asynchronous loop engine (one of :data:`.LOOP_ENGINES`) and the
+        number of concurrent requests per worker it handles.
+
+    :attr:`buffer_size`, :attr:`listen`
+        The size of the buffer for request headers in bytes and the size of
+        the listen queue.
+
+    :attr:`harakiri`, :attr:`max_requests`
+        The number of seconds after which a request is aborted and the number
+        of requests after which a worker is recycled.
+
+    :attr:`cheaper`, :attr:`cheaper_algo`, :attr:`cheaper_initial`, ...
+        The settings for spawning workers on demand: the minimum number of
+        workers, the algorithm (one of :data:`.CHEAPER_ALGORITHMS`), the
+        number of workers at startup and the number of workers to add at
+        once (:attr:`cheaper_step`).
+
+    :attr:`thunder_lock`
+        Whether workers serialize :func:`accept` calls.
+
+    Raises :class:`ValueError` if a setting is invalid.
+    """
+
+    __slots__ = tuple(name for name, _, _ in OPTIONS) + (
+        'loop', 'async_cores')
+
+    def __init__(self, *, loop=None, async_cores=None, **settings):
+        types = dict((name, type_) for name, _, type_ in OPTIONS)
+        for name in settings:
+            if name not in types:
+                raise TypeError('Unknown tuning setting %r' % name)
+        for name, type_ in types.items():
+            value = settings.get(name)
+            if value is not None:
+                value = _convert(name, value, type_)
+            object.__setattr__(self, name, value)
+        if loop is not None and loop not in LOOP_ENGINES:
+            raise ValueError('Unsupported loop engine %r' % loop)
+        if async_cores is not None:
+            async_cores = _convert('async_cores', async_cores, int)
+        if loop is not None and async_cores is None:
+            async_cores = 100
+        if async_cores is not None and loop is None:
+            raise ValueError('async_cores requires a loop engine')
+        object.__setattr__(self, 'loop', loop)
+        object.__setattr__(self, 'async_cores', async_cores)
+        if self.cheaper_algo is not None and \
+                self.cheaper_algo not in CHEAPER_ALGORITHMS:
+            raise ValueError('Unsupported cheaper algorithm %r' %
+                             self.cheaper_algo)
+        if self.cheaper is not None:
+            if self.processes is None or self.cheaper >= self.processes:
+                raise ValueError('cheaper must be lower than processes')
+
+    @classmethod
+    def from_section(cls, section):
+        """
+        Reads the settings from a :class:`~score.uwsgi.iniparser.UwsgiSection`
+        written by :meth:`.write`.
+        """
+        settings = {}
+        for name, option, _ in OPTIONS:
+            values = section.get_all(option)
+            if values:
+                settings[name] = values[-1]
+        for loop in LOOP_ENGINES:
+            values = section.get_all(loop)
+            if values:
+                settings['loop'] = loop
+                settings['async_cores'] = values[-1]
+        return cls(**settings)
+
+    def write(self, section):
+        """
+        Appends the settings as uwsgi options to given
+        :class:`~score.uwsgi.iniparser.UwsgiSection`.
+        """
+        for name, option, type_ in OPTIONS:
+            value = getattr(self, name)
+            if value is None or (type_ is bool and not value):
+                # uwsgi enables flags regardless of their value
+                continue
+            section[option] = value
+        if self.loop == 'gevent':
+            section['gevent'] = self.async_cores
+        elif self.loop == 'asyncio':
+            section['asyncio'] = self.async_cores
+            section['greenlet'] = True
+
+    def replace(self, **changes):
+        """
+        Returns a copy of this profile with some settings changed.
+        """
+        settings = self.settings()
+        settings.update(changes)
+        return Tuning(**settings)
+
+    def settings(self):
+        """
+        Returns a dict containing all settings, that are not `None`.
+        """
+        return dict((name, getattr(self, name)) for name in self.__slots__
+                    if getattr(self, name) is not None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Tuning profiles are immutable')
+
+    def __bool__(self):
+        return bool(self.settings())
+
+    def __eq__(self, other):
+        if not isinstance(other, Tuning):
+            return NotImplemented
+        return self.settings() == other.settings()
+
+    def __hash__(self):
+        return hash(tuple(sorted(self.settings().items())))
+
+    def __repr__(self):
+        return 'Tuning(%s)' % ', '.join(
+            '%s=%r' % item for item in sorted(self.settings().items()))
+
+
+def _convert(name, value, type_):
+    if type_ is bool:
+        if isinstance(value, str):
+            value = value.strip().lower()
+            if value not in ('true', 'false', '1', '0', 'yes', 'no', 'on',
+                             'off'):
+                raise ValueError('Invalid value for %s: %r' % (name, value))
+            return value in ('true', '1', 'yes', 'on')
+        return bool(value)
+    try:
+        value = type_(value)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid value for %s: %r' % (name, value))
+    if type_ is int and value < 0:
+        raise ValueError('%s must not be negative' % name)
+    return value
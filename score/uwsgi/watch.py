@@ -0,0 +1,323 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+Event-driven tracking of zergling states. A :class:`.Watcher` subscribes to
+:mod:`inotify <.inotify>` events in the folders of overlords and keeps the
+state of each of their zerglings in memory, so tools can react to state
+changes as they happen instead of polling.
+"""
+
+from collections import OrderedDict, namedtuple
+import logging
+import queue
+import threading
+import time
+
+from .inotify import (
+    IN_CLOSE_WRITE, IN_MODIFY, IN_Q_OVERFLOW, POLL_INTERVAL, Inotify,
+    available)
+from .process import NotRunning, StatsTimeout
+
+log = logging.getLogger(__name__)
+
+STARTING = 'starting'
+RUNNING = 'running'
+PAUSED = 'paused'
+RELOADING = 'reloading'
+STOPPED = 'stopped'
+
+#: All states a zergling can be in.
+STATES = (STARTING, RUNNING, PAUSED, RELOADING, STOPPED)
+
+#: A state transition of a *zergling*. The *old* state is `None` when the
+#: watcher sees a zergling for the first time and the *new* state is `None`
+#: when the zergling was removed from its overlord.
+Change = namedtuple('Change', ('zergling', 'old', 'new'))
+
+#: The suffixes of the files in an overlord's folder, that belong to a
+#: zergling and reflect its state.
+_SUFFIXES = ('.stats.sock', '.fifo.restart', '.fifo', '.startup', '.pid')
+
+
+def zergling_state(zergling):
+    """
+    Determines the state of given *zergling* from its files and, if these
+    are not conclusive, from a fresh statistics snapshot. Returns `None` if
+    the zergling did not deliver its statistics in time.
+    """
+    if zergling.is_starting():
+        return STARTING
+    if zergling.is_reloading():
+        return RELOADING
+    try:
+        zergling.refresh_snapshot()
+        return PAUSED if zergling.is_paused() else RUNNING
+    except NotRunning:
+        return STOPPED
+    except StatsTimeout:
+        return None
+
+
+class Watcher:
+    """
+    Keeps track of the states (see :data:`.STATES`) of all zerglings of given
+    *overlords*.
+
+    The watcher re-evaluates a zergling whenever one of its files in the
+    overlord's folder changes. Commands written to a zergling's fifo, like
+    :meth:`pausing <.Zergling.pause>`, only take effect a moment later, so
+    the zergling is re-checked every :attr:`.settle_interval` seconds for
+    :attr:`.settle_time` seconds afterwards. Changes that leave no trace in
+    the file system, like a crashed process, are detected by a full
+    :meth:`.refresh` every *resync* seconds.
+
+    Interested parties can :meth:`.subscribe` to :class:`Changes <.Change>`,
+    iterate over them with :meth:`.changes`, or asynchronously with ``async
+    for change in watcher``. The watcher itself runs in :meth:`.run`, or in
+    a background thread after calling :meth:`.start`.
+    """
+
+    #: Number of seconds a zergling is re-checked after a command was written
+    #: to its fifo.
+    settle_time = 2.0
+
+    #: Interval between two checks while a zergling is settling.
+    settle_interval = 0.05
+
+    def __init__(self, overlords, *, resync=5.0):
+        self.overlords = list(overlords)
+        self.resync = resync
+        self._states = OrderedDict()
+        self._subscribers = []
+        self._unsettled = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def subscribe(self, callback):
+        """
+        Registers a *callback*, that will be called with a :class:`.Change`
+        for every state transition. Callbacks are invoked from the thread
+        running the watcher and should return quickly. Returns the
+        *callback*, so this method can be used as a decorator.
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        """
+        Removes a callback registered with :meth:`.subscribe`.
+        """
+        with self._lock:
+            self._subscribers.remove(callback)
+
+    def state(self, zergling):
+        """
+        Returns the last known state of given *zergling*, or `None` if it is
+        not known (yet).
+        """
+        with self._lock:
+            entry = self._states.get(_key(zergling))
+        return entry[1] if entry else None
+
+    def states(self):
+        """
+        Returns an :class:`collections.OrderedDict` mapping all known
+        zerglings to their last known state.
+        """
+        with self._lock:
+            return OrderedDict(self._states.values())
+
+    def refresh(self):
+        """
+        Re-reads the zerglings of all overlords and re-evaluates all of them.
+        """
+        for overlord in self.overlords:
+            self._sync(overlord)
+
+    def changes(self, timeout=None):
+        """
+        A generator yielding :class:`Changes <.Change>` as they happen, which
+        requires the watcher to run in another thread (see :meth:`.start`).
+        Ends if no change happened for *timeout* seconds.
+        """
+        changes = queue.Queue()
+        self.subscribe(changes.put)
+        try:
+            while True:
+                try:
+                    yield changes.get(timeout=timeout)
+                except queue.Empty:
+                    return
+        finally:
+            self.unsubscribe(changes.put)
+
+    async def __aiter__(self):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        changes = asyncio.Queue()
+
+        def put(change):
+            loop.call_soon_threadsafe(changes.put_nowait, change)
+
+        self.subscribe(put)
+        try:
+            while True:
+                yield await changes.get()
+        finally:
+            self.unsubscribe(put)
+
+    def start(self):
+        """
+        Runs the watcher in a daemon thread and returns once the initial
+        states of all zerglings are known.
+        """
+        ready = threading.Event()
+        thread = threading.Thread(target=self.run, args=(ready,),
+                                  daemon=True)
+        thread.start()
+        ready.wait()
+        return thread
+
+    def run(self, ready=None):
+        """
+        Watches the overlords' folders until :meth:`.stop` is called. The
+        optional :class:`threading.Event` *ready* is set as soon as the
+        initial states are known.
+        """
+        if not available():
+            log.warning('inotify not available, polling instead')
+            self._initialize(ready)
+            while not self._stop.wait(POLL_INTERVAL):
+                self.refresh()
+            return
+        with Inotify() as inotify:
+            watches = {}
+            for overlord in self.overlords:
+                try:
+                    watches[inotify.add_watch(overlord.folder)] = overlord
+                except FileNotFoundError:
+                    log.warning('Not watching %s: folder missing' % overlord)
+            # the initial refresh happens after the watches were added, so
+            # no change can slip through between the two
+            self._initialize(ready)
+            next_resync = time.monotonic() + self.resync
+            while not self._stop.is_set():
+                now = time.monotonic()
+                timeout = min(next_resync - now, 0.5)
+                if self._unsettled:
+                    timeout = min(timeout, self.settle_interval)
+                for event in inotify.read(max(0, timeout)):
+                    if event.mask & IN_Q_OVERFLOW:
+                        self.refresh()
+                    elif event.wd in watches:
+                        self._handle(watches[event.wd], event)
+                self._settle()
+                if time.monotonic() >= next_resync:
+                    self.refresh()
+                    next_resync = time.monotonic() + self.resync
+
+    def stop(self):
+        """
+        Makes :meth:`.run` return within half a second.
+        """
+        self._stop.set()
+
+    def _initialize(self, ready):
+        try:
+            self.refresh()
+        finally:
+            if ready is not None:
+                ready.set()
+
+    def _handle(self, overlord, event):
+        if event.name == 'uwsgi.ini':
+            self._sync(overlord)
+            return
+        if not event.name.startswith('zergling-'):
+            return
+        for suffix in _SUFFIXES:
+            if event.name.endswith(suffix):
+                break
+        else:
+            return
+        name = event.name[len('zergling-'):-len(suffix)]
+        with self._lock:
+            entry = self._states.get((overlord.name, name))
+        if entry is None:
+            return
+        # writers of fifos only cause IN_CLOSE_WRITE on linux
+        if suffix == '.fifo' and event.mask & (IN_MODIFY | IN_CLOSE_WRITE):
+            self._unsettled[entry[0]] = time.monotonic() + self.settle_time
+        self._evaluate(entry[0])
+
+    def _settle(self):
+        now = time.monotonic()
+        for zergling, deadline in list(self._unsettled.items()):
+            if now >= deadline:
+                del self._unsettled[zergling]
+            else:
+                self._evaluate(zergling)
+
+    def _sync(self, overlord):
+        zerglings = overlord.zerglings()
+        current = set(_key(zergling) for zergling in zerglings)
+        with self._lock:
+            removed = [(key, entry) for key, entry in self._states.items()
+                       if key[0] == overlord.name and key not in current]
+            for key, _ in removed:
+                del self._states[key]
+        for _, (zergling, state) in removed:
+            self._unsettled.pop(zergling, None)
+            self._notify(Change(zergling, state, None))
+        for zergling in zerglings:
+            self._evaluate(zergling)
+
+    def _evaluate(self, zergling):
+        state = zergling_state(zergling)
+        if state is None:
+            return
+        key = _key(zergling)
+        with self._lock:
+            old = self._states.get(key, (None, None))[1]
+            self._states[key] = (zergling, state)
+        if old != state:
+            self._notify(Change(zergling, old, state))
+
+    def _notify(self, change):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(change)
+            except Exception:
+                log.exception('Error notifying %r' % callback)
+
+
+def _key(zergling):
+    return (zergling.overlord.name, zergling.name)
@@ -0,0 +1,95 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+"""
+Import time budget of the command line interface. Every invocation of
+``score-uwsgi`` pays for these imports, even when the command is merely
+forwarded to the control daemon.
+"""
+
+import subprocess
+import sys
+
+#: Modules, that must not be loaded by importing the command line interface.
+FORBIDDEN = (
+    'score.init',
+    'score.uwsgi.process',
+    'score.uwsgi.iniparser',
+    'score.uwsgi.configured',
+    'score.uwsgi.daemon',
+    'ctypes',
+    'tempfile',
+)
+
+#: Maximum time in microseconds spent importing the command line interface,
+#: excluding click.
+BUDGET = 25000
+
+
+def import_cli():
+    """
+    Imports the command line interface in a fresh interpreter and returns
+    the set of loaded modules and the cumulative import times of all modules
+    in microseconds, as reported by ``-X importtime``.
+    """
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         'import sys, score.uwsgi.cli; print(" ".join(sys.modules))'],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True,
+        universal_newlines=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        times[name.strip()] = int(cumulative)
+    return set(process.stdout.split()), times
+
+
+def test_cli_imports_no_heavy_modules():
+    modules, _ = import_cli()
+    assert not modules.intersection(FORBIDDEN)
+
+
+def test_package_imports_no_submodules():
+    process = subprocess.run(
+        [sys.executable, '-c',
+         'import sys, score.uwsgi; print(" ".join(sys.modules))'],
+        stdout=subprocess.PIPE, check=True, universal_newlines=True)
+    modules = process.stdout.split()
+    assert [m for m in modules if m.startswith('score.uwsgi.')] == []
+
+
+def test_cli_import_time():
+    best = None
+    for _ in range(3):
+        _, times = import_cli()
+        cost = times['score.uwsgi.cli'] - times.get('click', 0)
+        best = cost if best is None else min(best, cost)
+    assert best < BUDGET, 'Importing score.uwsgi.cli took %dus' % best
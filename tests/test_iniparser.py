@@ -0,0 +1,134 @@
+# Copyright © 2015 STRG.AT GmbH, Vienna, Austria
+#
+# This file is part of the The SCORE Framework.
+#
+# The SCORE Framework and all its parts are free software: you can redistribute
+# them and/or modify them under the terms of the GNU Lesser General Public
+# License version 3 as published by the Free Software Foundation which is in the
+# file named COPYING.LESSER.txt.
+#
+# The SCORE Framework and all its parts are distributed without any WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+# PARTICULAR PURPOSE. For more details see the GNU Lesser General Public
+# License.
+#
+# If you have not received a copy of the GNU Lesser General Public License see
+# http://www.gnu.org/licenses/.
+#
+# The License-Agreement realised between you as Licensee and STRG.AT GmbH as
+# Licenser including the issue of its valid conclusion and its pre- and
+# post-contractual effects is governed by the laws of Austria. Any disputes
+# concerning this License-Agreement including the issue of its valid conclusion
+# and its pre- and post-contractual effects are exclusively decided by the
+# competent court, in whose district STRG.AT GmbH has its registered seat, at
+# the discretion of STRG.AT GmbH also the competent court, in whose district the
+# Licensee has his registered seat, an establishment or assets.
+
+
+import os
+
+from score.uwsgi.iniparser import UwsgiIni
+
+
+def write(path, text):
+    with open(path, 'w') as fp:
+        fp.write(text)
+
+
+def contents(ini):
+    return [(name, section.pairs) for name, section in ini.sections.items()]
+
+
+def test_cache_hit_equals_fresh_parse(tmpdir):
+    path = str(tmpdir.join('uwsgi.ini'))
+    write(path, '[a]\nlogdate\nprocesses = 4\n\n[b]\nx = 1\nx = 2\n')
+    UwsgiIni.load_path(path)
+    assert os.path.exists(str(tmpdir.join('.uwsgi.ini.cache')))
+    assert contents(UwsgiIni.load_path(path)) == \
+        contents(UwsgiIni.load_path(path, cache=False))
+
+
+def test_cache_written_by_save_equals_fresh_parse(tmpdir):
+    path = str(tmpdir.join('uwsgi.ini'))
+    ini = UwsgiIni()
+    ini['a']['logdate'] = True
+    ini['a']['processes'] = 4
+    ini['a']['name'] = ' padded '
+    ini.save(path)
+    cached = UwsgiIni.load_path(path)
+    assert contents(cached) == contents(UwsgiIni.load_path(path, cache=False))
+    assert cached['a'].pairs == [
+        ('logdate', 'True'), ('processes', '4'), ('name', 'padded')]
+
+
+def test_cache_is_discarded_when_the_file_changes(tmpdir):
+    path = str(tmpdir.join('uwsgi.ini'))
+    write(path, '[a]\nx = 1\n')
+    UwsgiIni.load_path(path)
+    write(path, '[a]\nx = 22\n')
+    assert UwsgiIni.load_path(path)['a']['x'] == '22'
+
+
+def test_cache_survives_touching_the_file(tmpdir):
+    path = str(tmpdir.join('uwsgi.ini'))
+    write(path, '[a]\nx = 1\n')
+    UwsgiIni.load_path(path)
+    os.utime(path, (0, 0))
+    assert UwsgiIni.load_path(path)['a']['x'] == '1'
+
+
+def test_dumps_and_loads_round_trip():
+    text = '[a]\nlogdate = True\nx = 1\nx = 2\n\n[b]\ny = 3\n\n'
+    ini = UwsgiIni()
+    ini.loads(text)
+    assert ini.dumps() == text
+    copy = UwsgiIni()
+    copy.loads(ini.dumps())
+    assert contents(copy) == contents(ini)
+
+
+def test_dumps_omits_removed_entries():
+    ini = UwsgiIni()
+    ini.loads('[a]\nx = 1\ny = 2\nx = 3\n')
+    ini['a'].reset('x')
+    assert ini.dumps() == '[a]\ny = 2\n\n'
+
+
+def test_access_across_compaction():
+    ini = UwsgiIni()
+    section = ini['a']
+    for i in range(40):
+        section['key-%d' % i] = str(i)
+        section['multi'] = str(i)
+    for i in range(30):
+        del section['key-%d' % i]
+    for i in range(30):
+        assert section.pop('multi') == str(39 - i)
+    assert section.get_all('multi') == [str(i) for i in range(10)]
+    assert section['key-35'] == '35'
+    assert 'key-3' not in section
+    section.reset('multi', 'last')
+    assert section.get_all('multi') == ['last']
+    assert section.pop('missing', None) is None
+    assert section.pairs == \
+        [('key-%d' % i, str(i)) for i in range(30, 40)] + [('multi', 'last')]
+
+
+def test_modifications_through_pairs():
+    ini = UwsgiIni()
+    ini.loads('[a]\nx = 1\ny = 2\n')
+    section = ini['a']
+    assert section['x'] == '1'
+    section.pairs.append(('x', '3'))
+    assert section['x'] == '3'
+    assert section.get_all('x') == ['1', '3']
+    del section.pairs[0]
+    assert section.get_all('x') == ['3']
+    assert section.pop('y') == '2'
+    assert section.pairs == [('x', '3')]
+    section.pairs = [('z', '4'), ('z', '5')]
+    assert 'x' not in section
+    assert section.get_all('z') == ['4', '5']
+    section['z'] = '6'
+    assert section['z'] == '6'
+    assert ini.dumps() == '[a]\nz = 4\nz = 5\nz = 6\n\n'